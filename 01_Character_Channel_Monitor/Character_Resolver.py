@@ -0,0 +1,91 @@
+import threading
+from loguru import logger
+
+
+class CharacterResolver:
+    """Looks up the character name on a background thread and fills it into the events published without one.
+
+    The name is cached until the next login (LC), so channel changes and reconnects get it right away. Events are
+    never held back: they are published with the cached name or None, and enriched through
+    ConnectionEventStream.publish_update() once the provider returns a name.
+    """
+
+    def __init__(self, provider, stream, retry_delay=3.0, attempts=4):
+        self.provider = provider
+        self.stream = stream
+        self.retry_delay = retry_delay
+        self.attempts = attempts
+        self.name = None  # Cached name of the current login
+        self.generation = 0  # Incremented by invalidate(), a lookup started before a login is discarded
+        self.pending = []  # Events waiting for the name
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()  # Set while no event waits for the name
+        self._idle.set()
+        self._stopped = threading.Event()
+        self._thread = None
+        stream.subscribe(self)
+
+    def invalidate(self):
+        """Forget the cached name, called for a new login before its event is created."""
+        with self._lock:
+            self.name = None
+            self.generation += 1
+
+    def __call__(self, event):
+        if event.character is None:
+            with self._lock:
+                self.pending.append(event)
+                self._idle.clear()
+            if self._thread is None:
+                self.start()
+            self._wake.set()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="CharacterResolver", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Wait until the events published so far have their name or the lookup gave up, at most `timeout` seconds.
+
+        Defaults to the time all attempts of a lookup can take. Returns whether nothing is pending anymore.
+        """
+        return self._idle.wait(timeout if timeout is not None else self.retry_delay * self.attempts)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if not self._stopped.is_set():
+                self.resolve_pending()
+
+    def resolve_pending(self):
+        for attempt in range(self.attempts):
+            with self._lock:
+                generation = self.generation
+            name = self.provider.get_name()
+            with self._lock:
+                if name and generation == self.generation:
+                    self.name = name
+                    events, self.pending = self.pending, []
+                    for event in events:
+                        event.character = name  # Before waiters are released, see wait()
+                    self._idle.set()
+                    break
+            # Not written yet right after a login, try again a bit later
+            if attempt + 1 < self.attempts and self._stopped.wait(self.retry_delay):
+                return
+        else:
+            with self._lock:
+                events, self.pending = self.pending, []
+                self._idle.set()
+            logger.warning(f"Character name not found after {self.attempts} attempts, {len(events)} events stay without it")
+            return
+
+        for event in events:
+            self.stream.publish_update(event)
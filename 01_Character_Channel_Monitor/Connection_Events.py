@@ -0,0 +1,126 @@
+import datetime
+from collections import Counter, deque
+from loguru import logger
+
+LOGIN = "LC"  # First game server connection of the session
+CHANGE = "CC"  # Channel change
+RECONNECT = "RC"  # New connection to the same channel
+DISCONNECT = "DC"  # The last game server connection closed
+
+
+class ConnectionEvent:
+    """One login, channel change, reconnect or disconnect of the game."""
+
+    __slots__ = ("timestamp", "kind", "server", "local_port", "character")
+
+    def __init__(self, timestamp, kind, server, local_port=None, character=None):
+        self.timestamp = timestamp  # Epoch seconds
+        self.kind = kind
+        self.server = server  # Name from game_servers.json, e.g. "CH 05"
+        self.local_port = local_port
+        self.character = character  # None until the name is resolved
+
+    def __repr__(self):
+        return f"ConnectionEvent({self.timestamp!r}, {self.kind!r}, {self.server!r}, {self.local_port!r}, {self.character!r})"
+
+    @property
+    def character_name(self):
+        return self.character or "Unknown"
+
+    def time_text(self):
+        return datetime.datetime.fromtimestamp(self.timestamp).strftime("%H:%M:%S")
+
+    def format(self):
+        """The log line of the event, e.g. "12:00:00 - CC - CH 05 - Name"."""
+        return f"{self.time_text()} - {self.kind} - {self.server} - {self.character_name}"
+
+
+class ConnectionEventStream:
+    """In-process publish/subscribe of ConnectionEvents, the latest `history_size` are kept for the notifications."""
+
+    def __init__(self, history_size=200):
+        self.history = deque(maxlen=history_size)
+        self.subscribers = []
+        self.update_subscribers = []
+
+    def __len__(self):
+        return len(self.history)
+
+    def subscribe(self, callback):
+        """Register callback(event), called in publish order for every event."""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def subscribe_updates(self, callback):
+        """Register callback(event), called when a published event got its character name later on."""
+        self.update_subscribers.append(callback)
+
+    def publish(self, event):
+        self.history.append(event)
+        self._notify(self.subscribers, event)
+
+    def publish_update(self, event):
+        self._notify(self.update_subscribers, event)
+
+    @staticmethod
+    def _notify(callbacks, event):
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                # One failing consumer doesn't keep the event from the others
+                logger.error(f"Error in connection event subscriber: {e}")
+
+    def last(self, kinds=None):
+        """Latest event, of one of `kinds` when given, or None."""
+        for event in reversed(self.history):
+            if kinds is None or event.kind in kinds:
+                return event
+        return None
+
+    def recent(self, count):
+        """The latest `count` events, oldest first."""
+        return list(self.history)[-count:] if count > 0 else []
+
+
+def log_event(event):
+    logger.info(event.format())
+
+
+def log_event_update(event):
+    logger.info(f"{event.time_text()} - {event.kind} - {event.server} - character resolved: {event.character_name}")
+
+
+class SessionStats:
+    """Counts of each kind of event and the time spent on each server, fed as a subscriber."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.time_per_server = Counter()
+        self.current = None  # (server, since) while connected
+
+    def __call__(self, event):
+        self.counts[event.kind] += 1
+        self._close(event.timestamp)
+        if event.kind != DISCONNECT:
+            self.current = (event.server, event.timestamp)
+
+    def _close(self, timestamp):
+        if self.current is not None:
+            server, since = self.current
+            self.time_per_server[server] += max(timestamp - since, 0.0)
+            self.current = None
+
+    def summary(self, now):
+        """One line about the session up to `now`, e.g. "3 channel changes, 1 reconnects, most time on CH 05 (42m)"."""
+        times = self.time_per_server.copy()
+        if self.current is not None:
+            times[self.current[0]] += max(now - self.current[1], 0.0)
+        text = f"{self.counts[CHANGE]} channel changes, {self.counts[RECONNECT]} reconnects, {self.counts[DISCONNECT]} disconnects"
+        if times:
+            server, seconds = times.most_common(1)[0]
+            text += f", most time on {server} ({seconds / 60:.0f}m)"
+        return text
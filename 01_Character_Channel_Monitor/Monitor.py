@@ -5,8 +5,16 @@ import datetime
 import subprocess
 import json
 from loguru import logger
-from Notificator import telegram_message, webhook_message
-from Utilities import get_registry_value
+from Character_Resolver import CharacterResolver
+from Connection_Events import CHANGE, DISCONNECT, LOGIN, RECONNECT, ConnectionEvent, ConnectionEventStream, SessionStats, log_event, log_event_update
+from Notificator import HISTORY_COUNT, telegram_message, webhook_message
+from Utilities import create_name_provider
+
+
+# Established TCP connections of one process, psutil 6 renamed connections() to net_connections()
+def established_connections(process):
+    get_connections = getattr(process, "net_connections", None) or process.connections
+    return [conn for conn in get_connections(kind="tcp") if conn.status == psutil.CONN_ESTABLISHED and conn.raddr]
 
 
 class MapleStoryLauncher:
@@ -14,7 +22,15 @@ class MapleStoryLauncher:
         self.config = config
         self.prev_ch = None
         self.seen_connections = {}
-        self.ch_history = []
+        # Logins, channel changes, reconnects and disconnects, the latest "history_size" are kept for the notifications
+        self.events = ConnectionEventStream(config.get("history_size", 200))
+        self.events.subscribe(log_event)
+        self.events.subscribe_updates(log_event_update)
+        self.stats = SessionStats()
+        self.events.subscribe(self.stats)
+        self.resolver = CharacterResolver(create_name_provider(config), self.events)
+        self.game_process = None  # Cached psutil.Process of the game, only its own sockets are polled
+        self.poll_interval = config.get("poll_interval", 0.5)
         self.start_time_var = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     def start_steam_game(self, app_id):
@@ -32,49 +48,69 @@ class MapleStoryLauncher:
         subprocess.Popen(command)
 
     def is_game_running(self, game_name):
-        return any(p.name() == game_name for p in psutil.process_iter())
+        return self.find_game_process(game_name) is not None
+
+    @staticmethod
+    def find_game_process(process_name):
+        """First running process named `process_name`, None when there is none. Only process names are read."""
+        for proc in psutil.process_iter(['name']):
+            if proc.info['name'] == process_name:
+                return proc
+        return None
+
+    def get_game_process(self, process_name):
+        """The game's process, looked up by name only when none is cached yet or the cached one exited."""
+        if self.game_process is None:
+            self.game_process = self.find_game_process(process_name)
+            if self.game_process is not None:
+                logger.info(f"Monitoring {process_name} (PID {self.game_process.pid}).")
+        return self.game_process
+
+    def poll_connections(self, process_name):
+        """Established TCP connections of the game, None once it isn't running anymore."""
+        for _ in range(2):
+            process = self.get_game_process(process_name)
+            if process is None:
+                return None
+            try:
+                return established_connections(process)
+            except psutil.NoSuchProcess:
+                self.game_process = None  # Exited or restarted with a new PID, look it up again
+        return None
 
     def process_connected(self, local_port, ip_address):
-        key_value = get_registry_value(self.config["key_path"], self.config["key_name"])
-        current_datetime = datetime.datetime.now()
-        cc_time = current_datetime.strftime("%H:%M:%S")
-        char_name = key_value if key_value else 'Unknown'
-
-        retry_attempts = 3
-        while not key_value and retry_attempts > 0:
-            time.sleep(3)  # Wait for 3 seconds before retrying
-            key_value = get_registry_value(self.config["key_path"], self.config["key_name"])
-            if key_value:
-                char_name = key_value
-                break
-            retry_attempts -= 1
+        timestamp = time.time()
 
         # Ignore IP address if not found in the dictionary
         if ip_address not in self.config['ip_address_dict']:
             return  # Exit the function without logging anything
 
-        # Proceed with logging if the IP is in the dictionary
+        # Proceed with an event if the IP is in the dictionary
+        kind = None
         if ip_address in self.seen_connections:
             prev_local_port = self.seen_connections[ip_address]
             if prev_local_port != local_port and ip_address == self.prev_ch:
-                msg_print = f"{cc_time} - RC - {self.config['ip_address_dict'][ip_address]} - {char_name}"
-                logger.info(msg_print)
-                self.ch_history.append(msg_print)
+                kind = RECONNECT
             elif ip_address != self.prev_ch:
-                msg_print = f"{cc_time} - CC - {self.config['ip_address_dict'][ip_address]} - {char_name}"
-                logger.info(msg_print)
-                self.ch_history.append(msg_print)
+                kind = CHANGE
         elif self.prev_ch is None:
-            msg_print = f"{cc_time} - LC - {self.config['ip_address_dict'][ip_address]} - {char_name}"
-            logger.info(msg_print)
-            self.ch_history.append(msg_print)
+            kind = LOGIN
         else:
-            msg_print = f"{cc_time} - CC - {self.config['ip_address_dict'][ip_address]} - {char_name}"
-            logger.info(msg_print)
-            self.ch_history.append(msg_print)
+            kind = CHANGE
 
         self.prev_ch = ip_address
         self.seen_connections[ip_address] = local_port
+        if kind is not None:
+            if kind == LOGIN:
+                self.resolver.invalidate()  # Possibly another character, the name is looked up again
+            # Published right away, the resolver fills in the name in the background when it isn't cached
+            self.events.publish(ConnectionEvent(timestamp, kind, self.config['ip_address_dict'][ip_address], local_port, self.resolver.name))
+
+    def process_disconnected(self):
+        """The last game server connection closed, or the game exited while connected."""
+        last = self.events.last()
+        if last is not None and last.kind != DISCONNECT:
+            self.events.publish(ConnectionEvent(time.time(), DISCONNECT, last.server, last.local_port, last.character))
 
     def wait_for_enter_key(self):
         while True:
@@ -87,22 +123,26 @@ class MapleStoryLauncher:
         time.sleep(initial_wait)
 
         connection_found = False
+        known_connections = set()  # (remote ip, local port) of the connections established at the last poll
+        was_game_connected = False  # Whether any of them went to a server of game_servers.json
 
         while True:
             try:
-                # Check for the process
-                procs = [proc for proc in psutil.process_iter(['pid', 'name', 'connections']) if proc.info['name'] == process_name]
-                if procs:
-                    connections = procs[0].connections()
+                connections = self.poll_connections(process_name)
+                if connections is not None:
                     new_connection_found = False
 
-                    if connections:
-                        for conn in connections:
-                            if conn.status == psutil.CONN_ESTABLISHED:
-                                connection_tuple = (conn.laddr.ip, conn.laddr.port)
-                                if connection_tuple not in self.seen_connections:
-                                    new_connection_found = True
-                                    self.process_connected(conn.laddr.port, conn.raddr.ip)
+                    # Only connections opened since the last poll can be a login, channel change or reconnect
+                    for conn in connections:
+                        if (conn.raddr.ip, conn.laddr.port) not in known_connections:
+                            new_connection_found = True
+                            self.process_connected(conn.laddr.port, conn.raddr.ip)
+                    known_connections = {(conn.raddr.ip, conn.laddr.port) for conn in connections}
+
+                    game_connected = any(ip_address in self.config['ip_address_dict'] for ip_address, _ in known_connections)
+                    if was_game_connected and not game_connected:
+                        self.process_disconnected()
+                    was_game_connected = game_connected
 
                     if new_connection_found and not connection_found:
                         logger.info(f"Connections are established for {process_name}.")
@@ -114,18 +154,25 @@ class MapleStoryLauncher:
 
                 else:
                     logger.warning("Process not found anymore.")
+                    self.process_disconnected()
+                    logger.info(f"Session: {self.stats.summary(time.time())}")
+                    # The notifications name the character, give a lookup still in progress the time of its retries
+                    if not self.resolver.wait():
+                        logger.warning("Character name still unknown, sending the notifications without it")
+                    self.resolver.stop()
                     # Send webhook messages
+                    events = self.events.recent(HISTORY_COUNT)
                     if self.config["use_telegram"] == 1:
-                        telegram_message(self.config["telegram_api_url"], self.config["telegram_bot_token"], self.config["user_chat_id"], self.start_time_var, self.seen_connections, self.ch_history)
+                        telegram_message(self.config["telegram_api_url"], self.config["telegram_bot_token"], self.config["user_chat_id"], self.start_time_var, events)
                     if self.config["use_webhook"] == 1:
                         logger.info("Sending webhook message...")
-                        webhook_message(self.config["mUrl"], self.start_time_var, self.seen_connections, self.ch_history)
+                        webhook_message(self.config["mUrl"], self.start_time_var, events)
                         logger.info("Webhook message sent.")
                     time.sleep(3)
                     self.wait_for_enter_key()  # Ensure this is called after the webhook message
                     break
 
-                time.sleep(5)  # Adjust sleep duration as needed
+                time.sleep(self.poll_interval)  # "poll_interval" in config.json
 
             except psutil.NoSuchProcess as e:
                 logger.warning(f"Process no longer exists: {e}")
@@ -147,7 +194,7 @@ def load_config():
 
 
 if __name__ == '__main__':
-    logger.add("App_Log_{time}.log", rotation="30 days", backtrace=True, enqueue=False, catch=True)
+    logger.add("App_Log_{time}.log", rotation="30 days", backtrace=True, enqueue=True, catch=True)
 
     # Load configuration
     config = load_config()
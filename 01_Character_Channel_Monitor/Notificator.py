@@ -4,27 +4,25 @@ from loguru import logger
 import datetime
 
 
-def telegram_message(telegram_api_url, bot_token, chat_id, timevar, seen_connections, ch_history):
-    if seen_connections:
-        msg = ch_history[-1]
-        logger.info(msg)
-        # Split the input string by dashes
-        split_string = msg.split('-')
-        # Extract the desired substring
-        msg = split_string[-2].strip() + ' - ' + split_string[-1].strip()
-    else:
-        msg = 'Unknown'
+# Events in the [History] message, the caller passes ConnectionEventStream.recent(HISTORY_COUNT)
+HISTORY_COUNT = 20
+
+
+# Session start, [History] lines of the events and the last server and character, from ConnectionEvents
+def session_messages(timevar, events):
+    last = events[-1]
+    logger.info(last.format())
+    history_text = '\n'.join(f'[History] {event.format()}' for event in events)
+    game_closed_text = f'Game Closed - {last.server} - {last.character_name} - {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
+    return [f'Session Started - {timevar}', history_text, game_closed_text]
+
+
+def telegram_message(telegram_api_url, bot_token, chat_id, timevar, events):
     base_url = f'{telegram_api_url}{bot_token}/'
-    if ch_history:
-        # Send session information
-        session_text = f'Session Started - {timevar}'
-        send_telegram_message(base_url, chat_id, session_text)
-        # Concatenate history items with [History] prefix and line breaks
-        history_text = '\n'.join(f'[History] {item}' for item in ch_history[-20:])
-        send_telegram_message(base_url, chat_id, history_text)
-        # Send game closed message
-        game_closed_text = 'Game Closed - ' + msg + ' - ' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        send_telegram_message(base_url, chat_id, game_closed_text)
+    if events:
+        # Send session information, the history of the latest events and the game closed message
+        for text in session_messages(timevar, events):
+            send_telegram_message(base_url, chat_id, text)
     else:
         logger.warning('Process is not running')
 
@@ -47,26 +45,10 @@ def send_telegram_message(base_url, chat_id, text):
             time.sleep(2)
 
 
-def webhook_message(mUrl, timevar, seen_connections, ch_history):
-    if seen_connections:
-        msg = ch_history[-1]
-        logger.info(msg)
-        # Split the input string by dashes
-        split_string = msg.split('-')
-        # Extract the desired substring
-        msg = split_string[-2].strip() + ' - ' + split_string[-1].strip()
-    else:
-        msg = 'Unknown'
-    if ch_history:
-        # Send session information
-        session_text = f'Session Started - {timevar}'
-        send_webhook_message(mUrl, session_text)
-        # Concatenate history items with [History] prefix and line breaks
-        history_text = '\n'.join(f'[History] {item}' for item in ch_history[-20:])
-        send_webhook_message(mUrl, history_text)
-        # Send game closed message
-        game_closed_text = 'Game Closed - ' + msg + ' - ' + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        send_webhook_message(mUrl, game_closed_text)
+def webhook_message(mUrl, timevar, events):
+    if events:
+        for text in session_messages(timevar, events):
+            send_webhook_message(mUrl, text)
     else:
         logger.warning('Process is not running')
 
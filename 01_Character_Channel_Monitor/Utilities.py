@@ -1,6 +1,12 @@
-import winreg
+import os
+from abc import ABC, abstractmethod
 from loguru import logger
 
+try:
+    import winreg
+except ImportError:  # Not on Windows, only the file and environment providers work
+    winreg = None
+
 
 def get_registry_value(rkey_path, value_name):
     try:
@@ -11,4 +17,68 @@ def get_registry_value(rkey_path, value_name):
     except FileNotFoundError:
         logger.error(f"Registry key '{rkey_path}' not found.")
     except OSError as e:
-        logger.error(f"Error accessing registry key '{rkey_path}': {e}")
\ No newline at end of file
+        logger.error(f"Error accessing registry key '{rkey_path}': {e}")
+
+
+class NameProvider(ABC):
+    """Source of the logged in character's name, get_name() returns None while it isn't known."""
+
+    name = "base"
+
+    @abstractmethod
+    def get_name(self):
+        pass
+
+
+class RegistryNameProvider(NameProvider):
+    """The name the game writes to the Windows registry ("key_path" and "key_name" in config.json)."""
+
+    name = "registry"
+
+    def __init__(self, config):
+        if winreg is None:
+            raise ValueError("The registry name provider needs Windows, use the file or env provider instead")
+        self.key_path = config["key_path"]
+        self.key_name = config["key_name"]
+
+    def get_name(self):
+        return get_registry_value(self.key_path, self.key_name) or None
+
+
+class FileNameProvider(NameProvider):
+    """First line of a text file ("name_file" in config.json), e.g. for testing on Linux."""
+
+    name = "file"
+
+    def __init__(self, config):
+        self.path = config.get("name_file", "character_name.txt")
+
+    def get_name(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return f.readline().strip() or None
+        except OSError:
+            return None
+
+
+class EnvNameProvider(NameProvider):
+    """An environment variable ("name_env" in config.json, default MAPLESTORY_CHARACTER), e.g. for testing on Linux."""
+
+    name = "env"
+
+    def __init__(self, config):
+        self.variable = config.get("name_env", "MAPLESTORY_CHARACTER")
+
+    def get_name(self):
+        return os.environ.get(self.variable) or None
+
+
+NAME_PROVIDERS = {provider.name: provider for provider in (RegistryNameProvider, FileNameProvider, EnvNameProvider)}
+
+
+def create_name_provider(config):
+    """The provider selected by "name_provider" in config.json, the registry on Windows and env elsewhere by default."""
+    kind = config.get("name_provider") or ("registry" if winreg is not None else "env")
+    if kind not in NAME_PROVIDERS:
+        raise ValueError(f"Unknown name_provider '{kind}', expected one of {', '.join(NAME_PROVIDERS)}")
+    return NAME_PROVIDERS[kind](config)
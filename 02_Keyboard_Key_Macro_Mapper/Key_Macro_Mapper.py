@@ -83,7 +83,7 @@ if __name__ == "__main__":
     trigger_key, simulate_key = load_config()
 
     # Configure logging
-    logger.add("App_Log_{time}.log", rotation="30 days", backtrace=True, enqueue=False, catch=True)
+    logger.add("App_Log_{time}.log", rotation="30 days", backtrace=True, enqueue=True, catch=True)
     logger.info(f"Mapper is Active. Press 'Alt + `' to exit. Trigger key: {trigger_key}, Simulate key: {simulate_key}")
 
     # Handle exit signals (graceful exit for keyboard interrupt)
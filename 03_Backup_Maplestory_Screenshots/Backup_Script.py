@@ -57,7 +57,7 @@ def load_config():
 
 
 if __name__ == '__main__':
-    logger.add("App_Log_{time}.log", rotation="30 days", backtrace=True, enqueue=False, catch=True)
+    logger.add("App_Log_{time}.log", rotation="30 days", backtrace=True, enqueue=True, catch=True)
     # Load configuration from config.json
     config = load_config()
 
@@ -1,127 +1,182 @@
 import json
-import socket
-import time
-import concurrent.futures
 import os
-import psutil  # Requires installation: pip install psutil
+import sys
 from loguru import logger
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from App_Logging import setup_logging  # noqa: E402
+from Network_Interface import InterfaceResolver, interface_address  # noqa: E402
+from Prober import DEFAULT_CONCURRENCY, SamplingPolicy, run_probe_paths, run_probe_summaries, run_probes, run_sharded_probe_summaries, shard_count  # noqa: E402
+from Sample_Store import SampleStore  # noqa: E402
+from Server_Catalog import CatalogError, ServerCatalog, as_catalog  # noqa: E402
+from Server_Health import ServerHealth  # noqa: E402
+from Stats import StreamingStats  # noqa: E402
 
-# Function to check the default active network interface or VPN
-def get_default_network_interface():
+
+# Function to check the network interface or VPN that traffic to `destination` (a game server ip) leaves through
+def get_default_network_interface(destination=None):
     try:
-        # Get the active connections
-        active_connections = psutil.net_if_stats()
-
-        for interface, stats in active_connections.items():
-            if stats.isup:  # Check if the interface is up
-                for keyword in vpn_keywords:  # Check if the interface name contains any VPN keyword
-                    if keyword.lower() in interface.lower():
-                        return interface  # VPN detected
-                return interface  # Non-VPN active interface
-        return "unknown_interface"
-
-    except (psutil.Error, Exception) as e:
-        # Handle psutil-specific errors or other potential exceptions
+        interface = InterfaceResolver(vpn_keywords, destination).resolve()
+        return interface if interface is not None else "unknown_interface"
+
+    except Exception as e:
+        # Handle routing table or psutil errors
         logger.error(f"Error occurred while fetching network interface: {e}")
         return "error_fetching_interface"
 
 
-# Function to check if the server is reachable on the specified port
-def ping_server(ip, port=8585, timeout=1):
-    total_time = 0
-    successful_pings = 0
+# Convert a prober result to the value stored in the results, ms rounded to 0.01 or "N/A"
+def format_ping(latency):
+    return round(latency, 2) if latency is not None else "N/A"
 
-    try:
-        for _ in range(10):  # Perform 10 connection attempts
-            start_time = time.time()
-            try:
-                with socket.create_connection((ip, port), timeout) as sock:
-                    pass  # Connection successful
-                total_time += (time.time() - start_time)
-                successful_pings += 1
-            except (socket.timeout, socket.error):
-                continue  # Ignore failed connection attempts
-
-        if successful_pings > 0:
-            avg_ping = round((total_time / successful_pings) * 1000)  # Convert to ms and round to int
-        else:
-            avg_ping = "N/A"  # No successful pings
 
+# Function to check if the server is reachable on the specified port
+def ping_server(ip, port=8585, timeout=1, policy=None, health=None):
+    try:
+        # Up to 10 connection attempts, fewer when the policy reaches its confidence target or the server times out.
+        # With a ServerHealth the timeout follows the server's smoothed RTT, capped at `timeout`.
+        health = {ip: health} if health is not None else None
+        _, latency = run_probes([(ip, port)], timeout=timeout, attempts=10, policy=policy or SamplingPolicy(), health=health)[0]
     except Exception as e:
         # Catch any other unforeseen errors
         logger.error(f"Error occurred while pinging {ip}:{port} - {e}")
         return ip, "error"
 
-    return ip, avg_ping
+    return ip, format_ping(latency)
 
 
-# Ping all servers and get results
-def ping_all_servers(servers):
-    results = []
+# Ping all servers (a ServerCatalog or {ip: name}) concurrently on a single event loop and get (server_name, avg_ping, summary) results
+def ping_all_servers(servers, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    catalog = as_catalog(servers)
+    targets = [(record.ip, record.port) for record in catalog]
 
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=35) as executor:
-            futures = []
-            for ip, server_name in servers.items():
-                try:
-                    # Determine port based on server name
-                    if "Login" in server_name:
-                        port = 8484
-                    elif server_name in ["AH", "CS"]:
-                        port = 8786
-                    else:
-                        port = 8585
-
-                    futures.append(executor.submit(ping_server, ip, port))
-                except Exception as e:
-                    logger.error(f"Error while submitting ping task for server {server_name} ({ip}): {e}")
-                    results.append((server_name, "error"))
-
-            try:
-                for future in concurrent.futures.as_completed(futures):
-                    try:
-                        ip, avg_ping = future.result()
-                        server_name = servers[ip]
-                        results.append((server_name, avg_ping))
-                    except Exception as e:
-                        # Catch any exception that occurs during ping_server
-                        logger.error(f"Error occurred while pinging server {server_name} ({ip}): {e}")
-                        results.append((servers[ip], "error"))
-            except KeyboardInterrupt:
-                logger.info("\nPinging interrupted by user.")
-                executor.shutdown(wait=False)
-                return results
+        summaries = run_probe_summaries(targets, timeout=1, attempts=10, concurrency=concurrency, policy=policy or SamplingPolicy(), health=health)
+    except KeyboardInterrupt:
+        logger.info("\nPinging interrupted by user.")
+        return []
+    except Exception as e:
+        logger.error(f"Error occurred during probe execution: {e}")
+        return []
+
+    log_sampling_summary(summaries)
+    return [(catalog[summary.ip].name, format_ping(summary.average), summary) for summary in summaries]
 
+
+# Same as ping_all_servers with the servers split across `processes` worker processes, each with its own event loop.
+# For catalogs of thousands of endpoints, where a single loop can't start the connects on time. Returns sorted results.
+def ping_all_servers_sharded(servers, processes, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    catalog = as_catalog(servers)
+    targets = [(record.ip, record.port) for record in catalog]
+
+    try:
+        summaries = run_sharded_probe_summaries(targets, processes, timeout=1, attempts=10, concurrency=concurrency,
+                                                policy=policy or SamplingPolicy(), health=health)
+    except KeyboardInterrupt:
+        logger.info("\nPinging interrupted by user.")
+        return []
     except Exception as e:
-        logger.error(f"Error occurred during thread pool execution: {e}")
+        logger.error(f"Error occurred during sharded probe execution: {e}")
         return []
 
+    log_sampling_summary(summaries, f" in {shard_count(targets, processes)} processes")
+    return sort_servers([(catalog[summary.ip].name, format_ping(summary.average), summary) for summary in summaries])
+
+
+# Number of worker processes of the "probe_processes" setting, 0 means one per CPU core
+def get_probe_processes(setting):
+    return setting if setting > 0 else os.cpu_count() or 1
+
+
+# Resolve the "source_interfaces" of config.json (interface names or local addresses) to {interface: address}
+def resolve_source_addresses(interfaces):
+    sources = {}
+    for interface in interfaces:
+        address = interface_address(interface)
+        if address is None:
+            logger.warning(f"No IPv4 address found for interface '{interface}', skipping it")
+            continue
+        # Paths are told apart by their source address, a second interface with the same one would replace the first
+        duplicate = next((other for other, other_address in sources.items() if other_address == address), None)
+        if duplicate is not None:
+            logger.warning(f"Interface '{interface}' has the same address {address} as '{duplicate}', skipping it")
+            continue
+        sources[interface] = address
+    return sources
+
+
+# Ping all servers through every source address in one sweep, {interface: [(server_name, avg_ping, summary)]}
+# health: optional {interface: {ip: ServerHealth}}
+def ping_all_paths(servers, sources, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    catalog = as_catalog(servers)
+    targets = [(record.ip, record.port) for record in catalog]
+    health = health or {}
+
+    try:
+        summaries = run_probe_paths(targets, list(sources.values()), timeout=1, attempts=10, concurrency=concurrency,
+                                    policy=policy or SamplingPolicy(), health={sources[interface]: health.get(interface) for interface in sources})
+    except KeyboardInterrupt:
+        logger.info("\nPinging interrupted by user.")
+        return {}
+    except Exception as e:
+        logger.error(f"Error occurred during probe execution: {e}")
+        return {}
+
+    results = {}
+    for interface, address in sources.items():
+        log_sampling_summary(summaries[address], f" via {interface}")
+        results[interface] = [(catalog[summary.ip].name, format_ping(summary.average), summary) for summary in summaries[address]]
     return results
 
 
-# Update the log data with the latest pings, calculate averages, and track minimum ping
+# Log how many connection attempts the sweep needed and why the servers stopped early
+def log_sampling_summary(summaries, path=""):
+    if not summaries:
+        return
+    attempts = sum(len(summary.samples) for summary in summaries)
+    converged = sum(1 for summary in summaries if summary.stop_reason == "converged")
+    timeouts = sum(1 for summary in summaries if summary.stop_reason == "timeouts")
+    skipped = sum(1 for summary in summaries if summary.stop_reason == "circuit_open")
+    logger.info(f"Used {attempts} connection attempts for {len(summaries)} servers{path} ({attempts / len(summaries):.1f} per server), "
+                f"{converged} reached the confidence target, {timeouts} stopped after consecutive timeouts"
+                + (f", {skipped} skipped while unreachable" if skipped else ""))
+
+
+# Get the log entry of a server, creating it or migrating an old list-based entry when needed
+def get_log_entry(log_data, server_name):
+    if server_name not in log_data:
+        log_data[server_name] = {
+            f"{server_name}_avg": 0,
+            f"{server_name}_min": float('inf'),  # Set initial min value to a very high number
+            f"{server_name}_stats": StreamingStats().to_dict()
+        }
+
+    entry = log_data[server_name]
+    previous_pings = entry.pop(f"{server_name}_previous_pings", None)
+    if previous_pings is not None:
+        # Older log files kept every run in a list, fold it into the running aggregate once
+        stats = StreamingStats.from_samples(previous_pings)
+        entry[f"{server_name}_stats"] = stats.to_dict()
+        logger.info(f"Migrated {len(previous_pings)} previous pings of {server_name} to running statistics")
+    elif f"{server_name}_stats" not in entry:
+        entry[f"{server_name}_stats"] = StreamingStats().to_dict()
+
+    return entry
+
+
+# Update the log data with the latest pings, the running statistics make this O(1) per run
 def update_log_data(log_data, server_name, avg_ping):
     try:
-        # If the server name is not already in log_data, initialize its structure
-        if server_name not in log_data:
-            log_data[server_name] = {
-                f"{server_name}_previous_pings": [],
-                f"{server_name}_avg": 0,
-                f"{server_name}_min": float('inf')  # Set initial min value to a very high number
-            }
+        entry = get_log_entry(log_data, server_name)
 
         # Only update if avg_ping is valid (not "N/A")
         if isinstance(avg_ping, (int, float)):
-            # Update previous pings
-            log_data[server_name][f"{server_name}_previous_pings"].append(avg_ping)
-
-            # Recalculate the average
-            total_pings = log_data[server_name][f"{server_name}_previous_pings"]
-            log_data[server_name][f"{server_name}_avg"] = round(sum(total_pings) / len(total_pings))
+            stats = StreamingStats.from_dict(entry[f"{server_name}_stats"])
+            stats.add(avg_ping)
+            entry[f"{server_name}_stats"] = stats.to_dict()
 
-            # Update the minimum ping if the current one is lower
-            log_data[server_name][f"{server_name}_min"] = min(log_data[server_name][f"{server_name}_min"], avg_ping)
+            entry[f"{server_name}_avg"] = round(stats.mean, 2)
+            entry[f"{server_name}_min"] = stats.min
         else:
             logger.warning(f"Invalid ping value '{avg_ping}' for server {server_name}. Skipping update.")
 
@@ -152,55 +207,111 @@ def sort_servers(results):
     return sorted(results, key=server_sort_key)
 
 
-# Save results to the appropriate log_data_<network_interface>.json file
-def save_results_to_log(results, network_interface):
-    log_file = f'log_data_{network_interface}.json'
+# Load the running statistics of an interface, importing a legacy log_data_<network_interface>.json once
+def load_log_data(store, network_interface):
+    log_data = store.load_log_data(network_interface)
+    legacy_file = f'log_data_{network_interface}.json'
 
+    if log_data or not os.path.exists(legacy_file) or store.get_meta(f"imported:{legacy_file}") is not None:
+        return log_data
+
+    try:
+        with open(legacy_file, 'r') as f:
+            log_data = json.load(f)
+        for server_name in log_data:
+            get_log_entry(log_data, server_name)  # Migrates list-based entries to running statistics
+        store.save_log_entries(network_interface, log_data)
+        store.set_meta(f"imported:{legacy_file}", legacy_file)
+        logger.info(f"Imported {len(log_data)} servers from {legacy_file} into {store.path}")
+    except (IOError, json.JSONDecodeError) as e:
+        logger.error(f"Error importing log data from {legacy_file}: {e}")
+        log_data = {}
+
+    return log_data
+
+
+# Load the circuit breaker and RTT state of every server, seeding new servers from their recorded statistics
+def load_server_health(store, log_data, servers, network_interface, settings):
     try:
-        # Check if the log file exists, create it if it doesn't
-        if not os.path.exists(log_file):
-            with open(log_file, 'w') as f:
-                json.dump({}, f)  # Create an empty JSON object
-                logger.info(f"Created new log file: {log_file}")
-
-        # Load existing log data
-        with open(log_file, 'r') as f:
-            try:
-                log_data = json.load(f)
-            except json.JSONDecodeError as e:
-                logger.error(f"Error decoding JSON from {log_file}: {e}")
-                log_data = {}  # Fallback to an empty log_data if the file is corrupted
-
-        # Update log data with the current results
-        for server_name, avg_ping in results:
+        saved = json.loads(store.get_meta(f"health:{network_interface}", "{}"))
+    except json.JSONDecodeError as e:
+        logger.error(f"Error decoding server health of {network_interface}: {e}")
+        saved = {}
+
+    health = {}
+    for ip, server_name in servers.items():
+        health[ip] = ServerHealth.from_dict(saved.get(server_name, {}), **settings)
+        if server_name in log_data:
+            stats = StreamingStats.from_dict(get_log_entry(log_data, server_name)[f"{server_name}_stats"])
+            if stats.count:
+                health[ip].seed(stats.mean, stats.stddev())
+    return health
+
+
+def save_server_health(store, health, servers, network_interface):
+    store.set_meta(f"health:{network_interface}", json.dumps({servers[ip]: server_health.to_dict() for ip, server_health in health.items()}))
+
+
+# Append the raw samples of this run to the store and update the running statistics of the probed servers
+def save_results_to_log(store, log_data, results, network_interface):
+    try:
+        rows = []
+        for server_name, avg_ping, summary in results:
             update_log_data(log_data, server_name, avg_ping)
+            rows.extend((summary.timestamp, network_interface, server_name, summary.port, sample) for sample in summary.samples)
 
-        # Save the updated log data back to the file
-        with open(log_file, 'w') as f:
-            json.dump(log_data, f, indent=4)
-            # logger.info(f"Successfully updated log file: {log_file}")
+        store.append_samples(rows)
+        store.save_log_entries(network_interface, {server_name: log_data[server_name] for server_name, _, _ in results})
 
-    except IOError as e:
-        logger.error(f"File operation failed for {log_file}: {e}")
     except Exception as e:
-        logger.error(f"Unexpected error occurred while saving results: {e}")
+        logger.error(f"Unexpected error occurred while saving results to {store.path}: {e}")
+
+
+# Describe where the current ping falls within the recorded p50/p95/p99 latencies
+def describe_percentiles(stats, avg_ping):
+    if stats.count == 0:
+        return ""
+
+    p50, p95, p99 = (round(stats.percentile(q), 2) for q in (50, 95, 99))
+    if avg_ping > p99:
+        position = "slower than 99% of previous runs"
+    elif avg_ping > p95:
+        position = "slower than 95% of previous runs"
+    elif avg_ping <= p50:
+        position = "at or below the median"
+    else:
+        position = "above the median"
+    return f", {position} (p50 {p50} ms, p95 {p95} ms, p99 {p99} ms)"
+
+
+# Describe the jitter, standard deviation and loss of this run's samples
+def describe_link_quality(summary):
+    if summary is not None and summary.stop_reason == "circuit_open":
+        return ", not probed, unreachable in the previous runs"
+    if summary is None or not summary.samples:
+        return ""
+
+    parts = []
+    if summary.jitter is not None:
+        parts.append(f"jitter {summary.jitter:.2f} ms")
+    if summary.stddev is not None:
+        parts.append(f"stddev {summary.stddev:.2f} ms")
+    parts.append(f"loss {summary.loss:.0f}%")
+    parts.append(f"{len(summary.samples)} samples" + (" (timed out)" if summary.stop_reason == "timeouts" else ""))
+    return ", " + ", ".join(parts)
 
 
 # Print comparison between current and previous average pings
-def print_comparison(log_data, server_name, avg_ping):
+def print_comparison(log_data, server_name, avg_ping, summary=None):
     # Ensure that the server exists in log_data, otherwise initialize it
-    if server_name not in log_data:
-        log_data[server_name] = {
-            f"{server_name}_previous_pings": [],
-            f"{server_name}_avg": 0,
-            f"{server_name}_min": float('inf')  # Set initial min to a high value for new entries
-        }
+    entry = get_log_entry(log_data, server_name)
 
-    recorded_min = log_data[server_name][f"{server_name}_min"]
+    recorded_min = entry[f"{server_name}_min"]
+    stats = StreamingStats.from_dict(entry[f"{server_name}_stats"])
 
     # Ensure avg_ping is valid for comparison
     if avg_ping == "N/A":
-        logger.info(f"Server: {server_name}, Avg Ping: {avg_ping}")
+        logger.info(f"Server: {server_name}, Avg Ping: {avg_ping}{describe_link_quality(summary)}")
         return
 
     try:
@@ -209,87 +320,141 @@ def print_comparison(log_data, server_name, avg_ping):
             recorded_min = float('inf')  # Treat "N/A" or invalid values as a very high number
 
         if isinstance(avg_ping, (int, float)):
+            percentiles = describe_percentiles(stats, avg_ping) + describe_link_quality(summary)
             # Comparison logic
             if avg_ping > recorded_min:
-                logger.info(f"Server: {server_name}, Avg Ping: {avg_ping} ms, higher than minimum recorded ping ({recorded_min} ms)")
+                logger.info(f"Server: {server_name}, Avg Ping: {avg_ping} ms, higher than minimum recorded ping ({recorded_min} ms){percentiles}")
             elif avg_ping < recorded_min:
-                logger.info(f"Server: {server_name}, Avg Ping: {avg_ping} ms, lower than minimum recorded ping ({recorded_min} ms)")
+                logger.info(f"Server: {server_name}, Avg Ping: {avg_ping} ms, lower than minimum recorded ping ({recorded_min} ms){percentiles}")
             else:
-                logger.info(f"Server: {server_name}, Avg Ping: {avg_ping} ms, equal to minimum recorded ping ({recorded_min} ms)")
+                logger.info(f"Server: {server_name}, Avg Ping: {avg_ping} ms, equal to minimum recorded ping ({recorded_min} ms){percentiles}")
         else:
             logger.warning(f"Invalid avg_ping value '{avg_ping}' for server {server_name}")
     except Exception as e:
         logger.error(f"Error comparing pings for server {server_name}: {e}")
 
 
+# Print each server's average ping through every interface side by side and name the fastest path
+def print_path_comparison(results_by_interface):
+    pings = {}
+    for interface, results in results_by_interface.items():
+        for server_name, avg_ping, _ in results:
+            pings.setdefault(server_name, {})[interface] = avg_ping
+
+    for server_name, _, _ in sort_servers([(server_name, None, None) for server_name in pings]):
+        by_interface = pings[server_name]
+        columns = ", ".join(f"{interface}: {avg_ping} ms" if avg_ping != "N/A" else f"{interface}: N/A" for interface, avg_ping in by_interface.items())
+        reachable = {interface: avg_ping for interface, avg_ping in by_interface.items() if isinstance(avg_ping, (int, float))}
+        if len(reachable) < 2:
+            logger.info(f"Server: {server_name}, {columns}")
+            continue
+        fastest, slowest = min(reachable, key=reachable.get), max(reachable, key=reachable.get)
+        logger.info(f"Server: {server_name}, {columns}, fastest via {fastest} ({reachable[slowest] - reachable[fastest]:.2f} ms faster than {slowest})")
+
+
 def load_configuration_files():
     try:
         # Load the config.json to get VPN keywords
         with open('config.json', 'r') as f:
             config = json.load(f)
 
-        vpn_keywords = config.get('vpn_keywords', ['vpn'])  # Default to ['vpn'] if not found
-        # logger.info(f"Loaded VPN keywords: {vpn_keywords}")
-
     except FileNotFoundError:
         logger.error("Configuration file 'config.json' not found. Using default VPN keywords ['vpn'].")
-        vpn_keywords = ['vpn']  # Default value if the config file is missing
+        config = {}  # Default values are applied below if the config file is missing
     except json.JSONDecodeError as e:
         logger.error(f"Error decoding JSON from 'config.json': {e}")
-        vpn_keywords = ['vpn']  # Default value in case of a decode error
+        config = {}  # Default values are applied below in case of a decode error
+
+    config.setdefault('vpn_keywords', ['vpn'])  # Default to ['vpn'] if not found
+    config.setdefault('probe_concurrency', DEFAULT_CONCURRENCY)
+    config.setdefault('store_file', 'ping_data.db')
+    config.setdefault('raw_retention_days', 30)
+    config.setdefault('sampling', {})
+    config.setdefault('source_interfaces', [])
+    config.setdefault('probe_processes', 1)
+    # Runs are minutes apart, so an unreachable server is retried after 5 minutes rather than seconds
+    config['circuit_breaker'] = {"base_backoff": 300, "max_backoff": 3600, "max_timeout": 1, **config.get('circuit_breaker', {})}
+    # logger.info(f"Loaded VPN keywords: {config['vpn_keywords']}")
 
     try:
-        # Load the IPs and server names from game_servers.json
-        with open('game_servers.json', 'r') as f:
-            servers = json.load(f)
-        # logger.info(f"Loaded game servers: {servers}")
+        # Load the IPs, server names and ports from game_servers.json
+        servers = ServerCatalog.load('game_servers.json')
+        # logger.info(f"Loaded game servers: {servers.names()}")
 
     except FileNotFoundError:
         logger.error("Configuration file 'game_servers.json' not found. Returning empty server list.")
-        servers = {}  # Return an empty dictionary if the file is missing
+        servers = ServerCatalog()  # Return an empty catalog if the file is missing
     except json.JSONDecodeError as e:
         logger.error(f"Error decoding JSON from 'game_servers.json': {e}")
-        servers = {}  # Return an empty dictionary in case of a decode error
+        servers = ServerCatalog()  # Return an empty catalog in case of a decode error
+    except CatalogError as e:
+        # Probing a guess of the intended list would save results under the wrong names, stop instead
+        logger.error(f"Invalid 'game_servers.json': {e}")
+        sys.exit(1)
 
-    return vpn_keywords, servers
+    return config, servers
 
 
-if __name__ == "__main__":
-    logger.add("App_Log.log", rotation="30 days", backtrace=True, enqueue=False, catch=True)
+# Probe through every configured interface in the same sweep and compare the paths
+def run_multi_path(config, catalog):
+    servers = catalog.names()
+    sources = resolve_source_addresses(config['source_interfaces'])
+    store = SampleStore(config['store_file'], config['raw_retention_days'])
+    log_data = {interface: load_log_data(store, interface) for interface in sources}
+    health = {interface: load_server_health(store, log_data[interface], servers, interface, config['circuit_breaker']) for interface in sources}
 
-    try:
-        # Load Config and Servers
-        vpn_keywords, servers = load_configuration_files()
+    results = ping_all_paths(catalog, sources, config['probe_concurrency'], SamplingPolicy.from_config(config['sampling']), health)
+    print_path_comparison(results)
 
-        # Get the default active network interface or VPN
-        network_interface = get_default_network_interface()
-        logger.info(f"Using network interface: {network_interface}")
+    # Every path is stored under its own interface, like separate runs on each network would
+    for interface, interface_results in results.items():
+        save_server_health(store, health[interface], servers, interface)
+        save_results_to_log(store, log_data[interface], sort_servers(interface_results), interface)
+    store.start_compaction()  # After the samples of every path are in, see the single path run
+    store.close()
 
-        # Ping all servers
-        results = ping_all_servers(servers)
-        sorted_results = sort_servers(results)
 
-        # Load existing log data (create if necessary)
-        log_file = f'log_data_{network_interface}.json'
+if __name__ == "__main__":
+    setup_logging("App_Log.log")
 
-        try:
-            if not os.path.exists(log_file):
-                with open(log_file, 'w') as f:
-                    json.dump({}, f)  # Create an empty JSON object
+    try:
+        # Load Config and Servers
+        config, catalog = load_configuration_files()
+        servers = catalog.names()
+        vpn_keywords = config['vpn_keywords']
 
-            with open(log_file, 'r') as f:
-                log_data = json.load(f)
+        if config['source_interfaces']:
+            run_multi_path(config, catalog)
+        else:
+            # Get the default active network interface or VPN
+            network_interface = get_default_network_interface(next(iter(servers), None))
+            logger.info(f"Using network interface: {network_interface}")
+
+            # Open the sample store and the running statistics of this interface
+            store = SampleStore(config['store_file'], config['raw_retention_days'])
+            log_data = load_log_data(store, network_interface)
+            health = load_server_health(store, log_data, servers, network_interface, config['circuit_breaker'])
+
+            # Ping all servers, split across worker processes for very large server lists
+            processes = get_probe_processes(config['probe_processes'])
+            policy = SamplingPolicy.from_config(config['sampling'])
+            if processes > 1:
+                results = ping_all_servers_sharded(catalog, processes, config['probe_concurrency'], policy, health)
+            else:
+                results = ping_all_servers(catalog, config['probe_concurrency'], policy, health)
+            save_server_health(store, health, servers, network_interface)
+            sorted_results = sort_servers(results)
 
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            logger.error(f"Error loading log data from {log_file}: {e}")
-            log_data = {}  # Start with an empty log data structure
+            # Print and compare results
+            for server_name, avg_ping, summary in sorted_results:
+                print_comparison(log_data, server_name, avg_ping, summary)
 
-        # Print and compare results
-        for server_name, avg_ping in sorted_results:
-            print_comparison(log_data, server_name, avg_ping)
+            # Append the samples and save the updated statistics
+            save_results_to_log(store, log_data, sorted_results, network_interface)
 
-        # Save results to log_data_<network_interface>.json
-        save_results_to_log(sorted_results, network_interface)
+            # Roll up older samples only now, a run crossing the hour has samples in the hour it would mark as compacted
+            store.start_compaction()
+            store.close()
 
     except KeyboardInterrupt:
         logger.info("\nGracefully exiting...")
@@ -0,0 +1,203 @@
+import os
+import sys
+import time
+from bisect import bisect_left, insort
+from collections import deque
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from Server_Catalog import CHANNEL  # noqa: E402
+from Stats import HISTOGRAM_BUCKETS, bucket_index, bucket_value  # noqa: E402
+
+# Score weights, the score is in ms: p95 + jitter + ms per percent of failed probes + ms per spike in the window
+DEFAULT_WEIGHTS = {"p95": 1.0, "jitter": 1.0, "loss": 10.0, "spikes": 5.0}
+
+
+class ChannelWindow:
+    """Probe outcomes of one server over the last `window` seconds, with O(1) updates of every counter.
+
+    Latencies go into a log-spaced histogram (see Stats.py), so the p95 is read from the counts instead of sorting.
+    """
+
+    __slots__ = ("window", "entries", "histogram", "succeeded", "failed", "spikes", "jitter_sum", "jitter_count", "previous")
+
+    def __init__(self, window=60.0):
+        self.window = window
+        self.entries = deque()  # (timestamp, bucket or None for a failure, |latency change| or None, spiked)
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+        self.succeeded = 0
+        self.failed = 0
+        self.spikes = 0
+        self.jitter_sum = 0.0
+        self.jitter_count = 0
+        self.previous = None
+
+    def add(self, timestamp, latency, spiked=False):
+        bucket = difference = None
+        if latency is None:
+            self.failed += 1
+        else:
+            bucket = bucket_index(latency)
+            self.histogram[bucket] += 1
+            self.succeeded += 1
+            if self.previous is not None:
+                difference = abs(latency - self.previous)
+                self.jitter_sum += difference
+                self.jitter_count += 1
+            self.previous = latency
+        if spiked:
+            self.spikes += 1
+        self.entries.append((timestamp, bucket, difference, spiked))
+        self.expire(timestamp)
+
+    def expire(self, now):
+        while self.entries and self.entries[0][0] < now - self.window:
+            _, bucket, difference, spiked = self.entries.popleft()
+            if bucket is None:
+                self.failed -= 1
+            else:
+                self.histogram[bucket] -= 1
+                self.succeeded -= 1
+            if difference is not None:
+                self.jitter_sum -= difference
+                self.jitter_count -= 1
+            if spiked:
+                self.spikes -= 1
+
+    def percentile(self, q):
+        if not self.succeeded:
+            return None
+        rank = max(1, -(-q * self.succeeded // 100))
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return bucket_value(index)
+        return None
+
+    def jitter(self):
+        """Mean absolute change between consecutive latencies in the window."""
+        return self.jitter_sum / self.jitter_count if self.jitter_count else 0.0
+
+    def loss(self):
+        total = self.succeeded + self.failed
+        return 100 * self.failed / total if total else None
+
+
+class ChannelRanker:
+    """Engine subscriber ranking servers by a score over a sliding window, lower is better.
+
+    Every record re-scores only its own server: its old entry is found by bisection and the new one inserted, two
+    memmoves of the sorted list. Once a second the windows of servers without records (e.g. a breaker backing off)
+    are expired too, and top() skips servers whose last record is older than the window.
+    Only channels are ranked unless the server list has none, logins, AH and CS aren't something to switch to.
+    """
+
+    def __init__(self, engine, window=60.0, weights=None, min_samples=5):
+        self.engine = engine
+        self.window = window
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.min_samples = min_samples
+        self.windows = {}
+        # Sorted (score, ip, details), changed only on the probe thread, top() reads a copy
+        self.ranking = []
+        self.entries = {}  # ip -> its entry in the ranking
+        self.last_record = {}  # ip -> timestamp of its latest record
+        self.last_sweep = 0.0
+        self.last_spiked = {}
+
+    @classmethod
+    def from_config(cls, engine, settings):
+        """Build a ranker from the "recommender" section of config.json."""
+        settings = settings or {}
+        return cls(engine, settings.get("window", 60.0), settings.get("weights"), settings.get("min_samples", 5))
+
+    def ranked(self, ip):
+        record = self.engine.catalog.records.get(ip)
+        if record is None:
+            return False
+        return record.kind == CHANNEL or not self.engine.catalog.by_kind.get(CHANNEL)
+
+    def __call__(self, record):
+        """Probe thread path, O(1) apart from moving one entry within the ranking."""
+        ip = record["ip"]
+        now = record["timestamp"]
+        if now - self.last_sweep >= 1.0:
+            self.sweep(now)
+        if not self.ranked(ip):
+            return
+        # The engine counts spikes, a new one shows up as an increase of the server's counter
+        spiked = record["spiked"] > self.last_spiked.get(ip, 0)
+        self.last_spiked[ip] = record["spiked"]
+
+        window = self.windows.get(ip)
+        if window is None:
+            window = self.windows[ip] = ChannelWindow(self.window)
+        window.add(now, record["ping"], spiked)
+        self.last_record[ip] = now
+        self.update(ip, window)
+
+    def sweep(self, now):
+        """Expire the windows of servers that published nothing lately, O(servers) once a second."""
+        self.last_sweep = now
+        for ip, window in list(self.windows.items()):
+            if window.entries and window.entries[0][0] < now - self.window:
+                window.expire(now)
+                self.update(ip, window)
+
+    def remove(self, ip):
+        entry = self.entries.pop(ip, None)
+        if entry is not None:
+            index = bisect_left(self.ranking, entry)
+            if index < len(self.ranking) and self.ranking[index][1] == ip:
+                del self.ranking[index]
+            else:
+                self.ranking.remove(entry)  # Equal scores sort by ip, so this is only a safety net
+
+    def update(self, ip, window):
+        self.remove(ip)
+        samples = window.succeeded + window.failed
+        if window.succeeded and samples >= self.min_samples:
+            p95, jitter, loss = window.percentile(95), window.jitter(), window.loss()
+            score = (self.weights["p95"] * p95 + self.weights["jitter"] * jitter
+                     + self.weights["loss"] * loss + self.weights["spikes"] * window.spikes)
+            details = {"p95": p95, "jitter": jitter, "loss": loss, "spikes": window.spikes, "samples": samples, "score": score}
+            entry = self.entries[ip] = (score, ip, details)
+            insort(self.ranking, entry)
+        # Without enough recent data, or with nothing but failures, the server drops out of the ranking
+
+    def top(self, k=3):
+        """Best `k` servers as dicts with ip, server, score, p95, jitter, loss (%), spikes and samples."""
+        servers = self.engine.servers
+        stale = time.time() - self.window
+        result = []
+        for _, ip, details in list(self.ranking):  # Copied in one step, the probe thread may be moving an entry
+            if len(result) == k:
+                break
+            # A server without records for a whole window (e.g. not probed while backing off) has no current score
+            if ip in servers and self.last_record.get(ip, 0.0) >= stale:
+                result.append({"ip": ip, "server": servers[ip], **details})
+        return result
+
+    def reset(self, _=None):
+        """Forget every window, e.g. after the network interface changed."""
+        self.windows = {}
+        self.ranking = []
+        self.entries = {}
+        self.last_record = {}
+        self.last_spiked = {}
+
+    def sync_servers(self, servers):
+        """Drop the windows of servers removed from game_servers.json."""
+        for ip in list(self.windows):
+            if ip not in servers:
+                del self.windows[ip]
+                self.remove(ip)
+                self.last_record.pop(ip, None)
+                self.last_spiked.pop(ip, None)
+
+
+def describe_channels(channels):
+    """One line per recommended server, for the CLI and the log."""
+    return [f"{index}. {channel['server']} - score {channel['score']:.1f}, p95 {channel['p95']:.1f} ms, "
+            f"jitter {channel['jitter']:.1f} ms, loss {channel['loss']:.1f}%, {channel['spikes']} spikes"
+            for index, channel in enumerate(channels, 1)]
@@ -0,0 +1,232 @@
+import math
+import time
+import tkinter as tk
+from collections import deque
+from loguru import logger
+
+LABEL_WIDTH = 80  # Server names left of the graphs
+SCALE_WIDTH = 60  # Scale of each row right of its graph
+NICE_STEPS = (1, 2, 5)
+RESIZE_DELAY_MS = 150
+SLOW_WARNING_INTERVAL = 60  # Seconds between two warnings about slow refreshes
+
+
+def nice_ceiling(value):
+    """Smallest 1/2/5 x 10^n at or above `value`, so the scale of a row only changes at round numbers."""
+    if value <= 0:
+        return 1.0
+    magnitude = 10 ** math.floor(math.log10(value))
+    for step in NICE_STEPS:
+        if step * magnitude >= value:
+            return step * magnitude
+    return 10 * magnitude
+
+
+def decimate_min_max(samples, column_seconds, first_column):
+    """Min/max of (timestamp, value) samples per time column of `column_seconds`, as {column: [min, max]}.
+
+    Columns are numbered from the epoch, so a column keeps its number while the graph scrolls. Samples before
+    `first_column` are skipped. Drawing one vertical line per column keeps every spike visible, unlike averaging.
+    """
+    columns = {}
+    for timestamp, value in samples:
+        column = int(timestamp // column_seconds)
+        if column < first_column:
+            continue
+        extremes = columns.get(column)
+        if extremes is None:
+            columns[column] = [value, value]
+        elif value < extremes[0]:
+            extremes[0] = value
+        elif value > extremes[1]:
+            extremes[1] = value
+    return columns
+
+
+class GraphRow:
+    """Canvas items of one server's row: its label, scale and one line item per drawn column."""
+
+    __slots__ = ("ip", "index", "next_sequence", "columns", "peak", "scale", "label", "scale_label")
+
+    def __init__(self, ip, index):
+        self.ip = ip
+        self.index = index
+        self.next_sequence = 0  # First sample of the ring not drawn yet
+        self.columns = deque()  # [column, min, max, item] oldest first
+        self.peak = 0.0  # Highest max of the columns
+        self.scale = None  # Top of the row in ms
+        self.label = None
+        self.scale_label = None
+
+
+class LatencyGraph:
+    """Scrollable per-server sparklines of the last `window` seconds of samples, one row per server.
+
+    Samples are decimated to the min and max per pixel column, so an hour of 1 Hz pings of dozens of servers is a
+    few hundred line items per row. Each refresh only reads the samples that arrived since the previous one, adjusts
+    or adds the line of their column and scrolls every row with a single canvas move. A row is only drawn again
+    from its buffer when its scale changes or the panel is resized.
+    """
+
+    def __init__(self, master, engine, window=3600, row_height=28, height=240, refresh_budget_ms=50):
+        self.engine = engine
+        self.window = window
+        self.row_height = row_height
+        self.refresh_budget_ms = refresh_budget_ms
+        self.frame = tk.Frame(master)
+        self.canvas = tk.Canvas(self.frame, height=height, background="white", highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self.frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Configure>", self.on_resize)
+
+        self.rows = {}  # ip -> GraphRow
+        self.width = 0  # Pixel columns of the graphs, one column per `column_seconds`
+        self.column_seconds = 1.0
+        self.current_column = None  # Column at the right edge of the graphs
+        self.last_refresh_ms = 0.0
+        self.last_slow_warning = 0.0
+        self.pending_resize = None
+        self.set_servers(engine.servers)
+
+    @classmethod
+    def from_config(cls, master, engine, settings=None):
+        settings = settings or {}
+        return cls(master, engine, settings.get("window", 3600), settings.get("row_height", 28), settings.get("height", 240),
+                   settings.get("refresh_budget_ms", 50))
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def set_servers(self, servers):
+        """Rows for the servers of {ip: name} in its order, rows of unchanged servers keep their lines."""
+        for ip in list(self.rows):
+            if ip not in servers:
+                self.canvas.delete(f"row{id(self.rows.pop(ip))}")
+        for index, (ip, name) in enumerate(servers.items()):
+            row = self.rows.get(ip)
+            if row is None:
+                row = self.rows[ip] = GraphRow(ip, index)
+                self.draw_row(row, name)
+            elif row.index != index:
+                self.canvas.move(f"row{id(row)}", 0, (index - row.index) * self.row_height)
+                row.index = index
+            self.canvas.itemconfigure(row.label, text=name)
+        self.canvas.configure(scrollregion=(0, 0, 0, len(servers) * self.row_height))
+
+    def on_resize(self, event):
+        # Dragging the window edge sends a stream of events, the rows are drawn again once it pauses
+        if self.pending_resize is not None:
+            self.canvas.after_cancel(self.pending_resize)
+        self.pending_resize = self.canvas.after(RESIZE_DELAY_MS, self.apply_resize, max(event.width - LABEL_WIDTH - SCALE_WIDTH, 10))
+
+    def apply_resize(self, width):
+        self.pending_resize = None
+        if width != self.width:
+            self.width = width
+            self.column_seconds = self.window / width
+            self.current_column = None
+            self.redraw()
+
+    def redraw(self):
+        """Draw every row from its buffer, after a resize."""
+        self.canvas.delete("all")
+        for ip, row in self.rows.items():
+            row.columns.clear()
+            row.next_sequence = 0
+            row.peak = 0.0
+            row.scale = None
+            self.draw_row(row, self.engine.servers.get(ip, ""))
+        self.refresh()
+
+    def draw_row(self, row, name):
+        tag = f"row{id(row)}"
+        top = row.index * self.row_height
+        self.canvas.create_line(0, top + self.row_height - 1, LABEL_WIDTH + self.width + SCALE_WIDTH, top + self.row_height - 1,
+                                fill="#eeeeee", tags=(tag,))
+        row.label = self.canvas.create_text(4, top + self.row_height / 2, text=name, anchor="w", tags=(tag,))
+        row.scale_label = self.canvas.create_text(LABEL_WIDTH + self.width + 4, top + 2, text="", anchor="nw",
+                                                  fill="#888888", font=("TkDefaultFont", 7), tags=(tag,))
+
+    def y(self, row, value):
+        top = row.index * self.row_height
+        return top + self.row_height - 2 - (self.row_height - 4) * min(value / row.scale, 1.0)
+
+    def x(self, column):
+        return LABEL_WIDTH + self.width - (self.current_column - column)
+
+    def refresh(self):
+        """Scroll to the current time and draw the samples that arrived since the last refresh, on the Tk thread."""
+        if not self.width:
+            return  # Not mapped yet, <Configure> draws everything once it is
+        started = time.perf_counter()
+        now_column = int(time.time() // self.column_seconds)
+        if self.current_column is None:
+            self.current_column = now_column
+        elif now_column != self.current_column:
+            # Every line moves left in one call, the ones that scrolled out are deleted
+            self.canvas.move("series", self.current_column - now_column, 0)
+            self.current_column = now_column
+        first_column = now_column - self.width + 1
+
+        for row in self.rows.values():
+            dropped = False
+            while row.columns and row.columns[0][0] < first_column:
+                entry = row.columns.popleft()
+                self.canvas.delete(entry[3])
+                dropped = dropped or entry[2] >= row.peak
+            if dropped:
+                # The highest ping left the window, the row may zoom back in
+                row.peak = max((entry[2] for entry in row.columns), default=0.0)
+            self.update_row(row, first_column)
+        self.last_refresh_ms = 1000 * (time.perf_counter() - started)
+        if self.last_refresh_ms > self.refresh_budget_ms and time.time() - self.last_slow_warning >= SLOW_WARNING_INTERVAL:
+            # The Tk thread is blocked meanwhile, a shorter window or fewer servers keep the UI responsive
+            self.last_slow_warning = time.time()
+            logger.warning(f"Latency graph refresh took {self.last_refresh_ms:.0f} ms, over the {self.refresh_budget_ms} ms budget "
+                           f"({len(self.rows)} rows, {self.width} columns)")
+
+    def update_row(self, row, first_column):
+        ring = self.engine.average_pings.get(row.ip)
+        new_columns = None
+        if ring is not None:
+            with self.engine.sample_lock:
+                if ring.sequence != row.next_sequence:
+                    # Only samples not drawn yet, the first refresh of a row reads the whole buffer
+                    samples = [sample for timestamps, values in ring.segments(row.next_sequence) for sample in zip(timestamps, values)]
+                    row.next_sequence = ring.sequence
+                    new_columns = decimate_min_max(samples, self.column_seconds, first_column)
+
+        changed = []
+        columns = row.columns
+        for column in sorted(new_columns or ()):
+            low, high = new_columns[column]
+            if columns and columns[-1][0] == column:
+                entry = columns[-1]
+                entry[1], entry[2] = min(entry[1], low), max(entry[2], high)
+            elif not columns or columns[-1][0] < column:
+                entry = [column, low, high, None]
+                columns.append(entry)
+            else:
+                continue
+            row.peak = max(row.peak, entry[2])
+            changed.append(entry)
+
+        scale = nice_ceiling(row.peak)
+        if scale != row.scale:
+            row.scale = scale
+            self.canvas.itemconfigure(row.scale_label, text=f"{scale:g} ms")
+            changed = columns  # Every line of the row moves to the new scale
+        for entry in changed:
+            self.draw_column(row, entry)
+
+    def draw_column(self, row, entry):
+        column, low, high, item = entry
+        x = self.x(column)
+        # A 1 px tall line for a column whose samples are all the same value
+        coordinates = (x, self.y(row, low) + 1, x, self.y(row, high))
+        if item is None:
+            entry[3] = self.canvas.create_line(*coordinates, fill="#1f77b4", tags=("series", f"row{id(row)}"))
+        else:
+            self.canvas.coords(item, *coordinates)
@@ -1,14 +1,17 @@
+import os
+import sys
 import tkinter as tk
-import concurrent.futures
-import json
-import socket
-import threading
-import time
-import psutil
 from datetime import datetime
 from queue import Queue
 from tkinter import ttk, messagebox, filedialog
 from loguru import logger
+from Latency_Graph import LatencyGraph
+from Metrics_Server import start_metrics_server
+from Ping_Engine import PingEngine, load_json
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from App_Logging import setup_logging  # noqa: E402
+from Server_Catalog import ServerCatalog  # noqa: E402
 
 
 class PingApp:
@@ -20,42 +23,43 @@ class PingApp:
         # Bind close event to a cleanup method
         self.master.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        self.servers = {}
+        self.servers = None
         self.load_servers()
 
+        # VPN detection keywords and probe settings
+        self.config = self.load_config()
+
+        # All measurement state lives in the engine, the window only renders the records it publishes
+        self.engine = PingEngine(self.servers, self.config)
+        self.engine.subscribe(self.on_engine_record)
+        self.engine.subscribe_interface(self.on_engine_interface)
+        self.engine.subscribe_catalog(self.on_engine_catalog)
+        self.metrics_server = start_metrics_server(self.engine, self.config)
+
         self.running = False
-        self.lowest_pings = {ip: None for ip in self.servers.keys()}
-        self.average_pings = {ip: [] for ip in self.servers.keys()}
-        self.total_pings = {ip: 0 for ip in self.servers.keys()}
-        self.failed_pings = {ip: 0 for ip in self.servers.keys()}
-        self.spiked_pings = {ip: 0 for ip in self.servers.keys()}
-        self.succeeded_pings = {ip: 0 for ip in self.servers.keys()}
         self.ping_queue = Queue()
+        self.pending_interface = None  # Set by the engine when the route flips while pinging
+        self.pending_servers = None  # Set by the engine when game_servers.json was reloaded
         self.elapsed_time = 0.0
-        self.ping_thread = None
-        self.last_five_pings = {ip: [] for ip in self.servers.keys()}  # Track last five pings
-        self.spike_threshold_percentage = 0.15  # 15% for spike detection
-        # Initialize last spike time tracker for each IP
-        self.last_spike_time = {}
-        # Initialize previous spikes tracker for each IP
-        self.previous_spikes = {}
-        # Initialize spike detection state
-        self.spike_detected = {}  # This will hold the spike detection status for each server
-        self.spike_display_time = {}
+
+        # Rows waiting for the next UI refresh, only the newest ping of each server is kept
+        self.pending_rows = {}
+        self.row_values = {}  # Values last written to each row, unchanged rows are skipped
+        self.ui_refresh_ms = self.config.get("ui_refresh_ms", 250)
+        self.recommend_count = self.config.get("recommender", {}).get("top", 3)
+        self.exporter = None  # Running raw sample export
 
         # Setup UI
         self.create_widgets()
 
-        # VPN detection keywords
-        self.vpn_keywords = self.load_vpn_keywords()
-
         # Update network interface
-        self.current_interface = None
         self.update_network_interface()
 
     def on_close(self):
         """Gracefully shut down by calling stop_pinging and waiting for thread to finish."""
         self.stop_pinging()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
         self.check_thread_closed()  # Use a separate method to check if the thread has finished
         logger.info("PingApp Closed")
 
@@ -71,6 +75,8 @@ class PingApp:
         self.stop_button.pack(side=tk.LEFT, padx=5)
 
         tk.Button(button_frame, text="Export to Log", command=self.export_log).pack(side=tk.LEFT, padx=5)
+        self.export_samples_button = tk.Button(button_frame, text="Export Samples", command=self.export_samples)
+        self.export_samples_button.pack(side=tk.LEFT, padx=5)
         tk.Button(button_frame, text="Information", command=self.show_information).pack(side=tk.LEFT, padx=5)
 
         # Network interface display
@@ -81,18 +87,28 @@ class PingApp:
         self.timer_label = tk.Label(self.master, text="Elapsed Time: 00:00:00.0")
         self.timer_label.pack(pady=5)
 
+        # Best channels right now, from the engine's ranking
+        self.recommendation_label = tk.Label(self.master, text="Best Channels: waiting for data")
+        self.recommendation_label.pack(pady=5)
+
+        # Progress of a raw sample export, empty while none is running
+        self.export_label = tk.Label(self.master, text="")
+        self.export_label.pack()
+
         # Table setup with Scrollbar
         self.tree_frame = tk.Frame(self.master)
         self.tree_frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
 
         # Define table columns
-        self.tree = ttk.Treeview(
-            self.tree_frame, columns=("Server", "Ping", "Lowest Ping", "Average Ping", "Total Pings", "Succeeded Pings", "Failed Pings", "Spiked Pings", "Spike Ping"), show='headings'
-        )
+        self.columns = ("Server", "Ping", "Lowest Ping", "Average Ping", "Jitter", "Std Dev", "Loss", "Total Pings", "Succeeded Pings", "Failed Pings", "Spiked Pings", "Spike Ping")
+        self.tree = ttk.Treeview(self.tree_frame, columns=self.columns, show='headings')
         self.tree.heading("Server", text="Server")
         self.tree.heading("Ping", text="Ping")
         self.tree.heading("Lowest Ping", text="Lowest Ping")
         self.tree.heading("Average Ping", text="Average Ping")
+        self.tree.heading("Jitter", text="Jitter")
+        self.tree.heading("Std Dev", text="Std Dev")
+        self.tree.heading("Loss", text="Loss")
         self.tree.heading("Total Pings", text="Total Pings")
         self.tree.heading("Succeeded Pings", text="Succeeded Pings")
         self.tree.heading("Failed Pings", text="Failed Pings")
@@ -104,6 +120,9 @@ class PingApp:
         self.tree.column("Ping", width=80)
         self.tree.column("Lowest Ping", width=80)
         self.tree.column("Average Ping", width=80)
+        self.tree.column("Jitter", width=70)
+        self.tree.column("Std Dev", width=70)
+        self.tree.column("Loss", width=60)
         self.tree.column("Total Pings", width=80)
         self.tree.column("Succeeded Pings", width=110)
         self.tree.column("Failed Pings", width=80)
@@ -116,62 +135,38 @@ class PingApp:
         self.tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        # Insert initial server data into the table
-        for ip, name in self.servers.items():
-            self.tree.insert("", "end", values=(name, "", "", "", "", "", "", ""))
+        # Insert initial server data into the table and index the rows by server ip
+        self.tree_items = {}
+        for ip, name in self.engine.servers.items():
+            self.tree_items[ip] = self.tree.insert("", "end", values=(name,) + ("",) * (len(self.columns) - 1))
+
+        # Latency of each server over the last hour, drawn from the engine's sample buffers
+        self.graph = LatencyGraph.from_config(self.master, self.engine, self.config.get("graph"))
+        self.graph.pack(padx=10, pady=(0, 10), fill=tk.X)
 
     def load_servers(self):
-        with open("game_servers.json") as f:
-            self.servers = json.load(f)
+        self.servers = ServerCatalog.load("game_servers.json")
 
-    def load_vpn_keywords(self):
-        with open("config.json") as f:
-            config = json.load(f)
-            return config.get("vpn_keywords", [])
+    def load_config(self):
+        return load_json("config.json")
 
     def update_network_interface(self):
-        interface = self.get_default_network_interface()
-        if interface != self.current_interface:
-            self.current_interface = interface
-            self.lowest_pings = {ip: None for ip in self.servers.keys()}
-            self.total_pings = {ip: 0 for ip in self.servers.keys()}
-            self.failed_pings = {ip: 0 for ip in self.servers.keys()}
-            self.succeeded_pings = {ip: 0 for ip in self.servers.keys()}
-            self.spiked_pings = {ip: 0 for ip in self.servers.keys()}
-            self.last_five_pings = {ip: [] for ip in self.servers.keys()}  # Reset last five pings
-            for item in self.tree.get_children():
+        interface, changed = self.engine.update_network_interface()
+        self.show_network_interface(interface, changed)
+
+    def show_network_interface(self, interface, changed=True):
+        if changed:
+            self.ping_queue.queue.clear()
+            self.pending_rows.clear()
+            self.row_values.clear()
+            for item in self.tree_items.values():
                 values = self.tree.item(item, 'values')
-                self.tree.item(item, values=(values[0], values[1], "", "", "", "", "", ""))
+                self.tree.item(item, values=(values[0], values[1]) + ("",) * (len(self.columns) - 2))
 
         self.network_interface_label.config(text=f"Current Network Interface: {interface}")
 
-    def get_default_network_interface(self):
-        try:
-            interfaces = psutil.net_if_addrs()
-            active_vpn = None
-            for interface in interfaces:
-                if any(keyword.lower() in interface.lower() for keyword in self.vpn_keywords):
-                    stats = psutil.net_if_stats()[interface]
-                    if stats.isup:
-                        active_vpn = interface
-            if active_vpn:
-                logger.info(f"VPN Detected: {active_vpn}")
-                return f"VPN Detected: {active_vpn}"
-            for interface in interfaces:
-                stats = psutil.net_if_stats()[interface]
-                if stats.isup:
-                    if interface != self.current_interface:
-                        logger.info(f"No VPN detected, using {interface}")
-                    return interface
-            logger.warning("No Active Interface found")
-            return "No active interface found"
-        except Exception as e:
-            logger.error("Error fetching interface: " + str(e))
-            return "Error fetching interface: " + str(e)
-
     def start_pinging(self):
         if not self.running:
-            logger.info("Starting to ping servers...")
             self.running = True
             self.update_network_interface()
             self.elapsed_time = 0.0
@@ -179,19 +174,19 @@ class PingApp:
             self.stop_button.config(state=tk.NORMAL)
             self.ping_queue.queue.clear()
             self.update_timer()
-            self.ping_thread = threading.Thread(target=self.run_ping_thread)
-            self.ping_thread.start()
+            self.engine.start()
+            self.process_queue()
 
     def stop_pinging(self):
         """Set running to False to allow the pinging thread to exit gracefully."""
-        logger.info("Stopping ping process...")
         self.running = False
+        self.engine.stop()
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
 
     def check_thread_closed(self):
         """Check if the pinging thread has closed, then destroy the window."""
-        if self.ping_thread is not None and self.ping_thread.is_alive():
+        if self.engine.is_running():
             # Keep checking every 100 milliseconds until the thread stops
             logger.warning("Ping process still running, attempting to close it.")
             self.master.after(100, self.check_thread_closed)
@@ -210,127 +205,85 @@ class PingApp:
             self.timer_label.config(text=f"Elapsed Time: {formatted_time}")
             self.master.after(100, self.update_timer)
 
-    def run_ping_thread(self):
-        while self.running:
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = {executor.submit(self.ping_server, ip, name): ip for ip, name in self.servers.items()}
-                for future in concurrent.futures.as_completed(futures):
-                    ip = futures[future]
-                    try:
-                        ping_time = future.result()  # This could raise an exception
-                        # Only add to queue if ping_time is valid (not None)
-                        if ping_time is not None:
-                            self.ping_queue.put((ip, ping_time))
-                        else:
-                            # logger.warning(f"Ping time for {self.servers[ip]} was None.")
-                            self.failed_pings[ip] += 1
-                    except Exception as e:
-                        logger.error(f"Error pinging {self.servers[ip]}: {e}")
-            time.sleep(1)
-            self.master.after(0, self.process_queue)
+    def on_engine_record(self, record):
+        """Called by the engine's probe thread, hand the record over to the Tk thread."""
+        # Only successful pings update the row, failures show up in the counters of the next one
+        if record["ping"] is not None:
+            self.ping_queue.put(record)
+
+    def on_engine_interface(self, interface):
+        """Called by the engine's probe thread after it reset the statistics for a new interface."""
+        self.pending_interface = interface
+
+    def on_engine_catalog(self, servers):
+        """Called by the engine's probe thread with the reloaded {ip: name}."""
+        self.pending_servers = servers
+
+    def sync_rows(self, servers):
+        """Add, remove and rename rows to match the reloaded server list, other rows keep their values."""
+        for ip in list(self.tree_items):
+            if ip not in servers:
+                self.tree.delete(self.tree_items.pop(ip))
+                self.row_values.pop(ip, None)
+                self.pending_rows.pop(ip, None)
+        for ip, name in servers.items():
+            if ip not in self.tree_items:
+                self.tree_items[ip] = self.tree.insert("", "end", values=(name,) + ("",) * (len(self.columns) - 1))
+            else:
+                values = self.tree.item(self.tree_items[ip], 'values')
+                if values and values[0] != name:
+                    self.tree.item(self.tree_items[ip], values=(name,) + tuple(values[1:]))
+                    self.row_values.pop(ip, None)
 
     def process_queue(self):
+        if self.pending_interface is not None:
+            interface, self.pending_interface = self.pending_interface, None
+            self.show_network_interface(interface)
+        if self.pending_servers is not None:
+            servers, self.pending_servers = self.pending_servers, None
+            self.sync_rows(servers)
+            self.graph.set_servers(servers)
+
         while not self.ping_queue.empty():
-            ip, ping_time = self.ping_queue.get()
-            self.total_pings[ip] += 1
-            if ping_time == float('inf'):
-                self.failed_pings[ip] += 1
-            else:
-                self.succeeded_pings[ip] += 1
-                if self.lowest_pings[ip] is None or ping_time < self.lowest_pings[ip]:
-                    self.lowest_pings[ip] = ping_time
-                self.average_pings[ip].append(ping_time)
-                self.last_five_pings[ip].append(ping_time)  # Track last five pings
-                if len(self.last_five_pings[ip]) > 5:
-                    self.last_five_pings[ip].pop(0)  # Keep only the last five pings
-            self.update_tree(ip, ping_time)
-
-    def ping_server(self, ip, name):
-        port = self.get_port(name)
-        start_time = time.time()
-        try:
-            with socket.create_connection((ip, port), timeout=2):
-                ping_time = (time.time() - start_time) * 1000
-                return int(ping_time)  # The time taken for the ping in milliseconds
-        except Exception as e:
-            logger.error(f"Failed to ping server: {self.servers[ip]}. Error: {e}")
-            return None  # Return None or a specific error code to signify failure
-
-    def get_port(self, name):
-        if "Login" in name:
-            return 8484
-        elif "AH" in name or "CS" in name:
-            return 8786
+            record = self.ping_queue.get()
+            self.pending_rows[record["ip"]] = record
+
+        self.refresh_tree()
+        self.refresh_recommendation()
+        self.graph.refresh()
+        if self.running:
+            self.master.after(self.ui_refresh_ms, self.process_queue)
+
+    def refresh_tree(self):
+        """Apply at most one update per row, coalescing every sample received since the last refresh."""
+        pending, self.pending_rows = self.pending_rows, {}
+        for record in pending.values():
+            if record["ip"] in self.tree_items:  # Servers removed by a reload may still have records in flight
+                self.update_tree(record)
+
+    def refresh_recommendation(self):
+        channels = self.engine.recommend(self.recommend_count)
+        if channels:
+            text = "Best Channels: " + ", ".join(f"{channel['server']} ({channel['p95']:.0f} ms p95, {channel['loss']:.0f}% loss)" for channel in channels)
         else:
-            return 8585
-
-    def update_tree(self, ip, ping_time):
-        current_time = time.time()
-        for item in self.tree.get_children():
-            values = self.tree.item(item, 'values')
-            if values[0] == self.servers[ip]:
-                average_ping = sum(self.average_pings[ip]) // len(self.average_pings[ip]) if self.average_pings[ip] else 0
-                # Determine spike message
-                spike_ping = self.detect_ping_spike(ip, current_time)
-                if spike_ping == "No Spike":
-                    spike_ping = ""  # Reset spike message if no spike is detected
-                self.tree.item(item, values=(
-                    values[0], f"{ping_time}ms", self.lowest_pings[ip] if self.lowest_pings[ip] is not None else "",
-                    average_ping, self.total_pings[ip], self.succeeded_pings[ip],
-                    self.failed_pings[ip], self.spiked_pings[ip], spike_ping
-                ))
-
-    def detect_ping_spike(self, ip, current_time):
-        # Initialize last spike time and spike detected flag if not set for this IP
-        if ip not in self.last_spike_time:
-            self.last_spike_time[ip] = 0
-        if ip not in self.spike_detected:
-            self.spike_detected[ip] = False
-            self.spike_display_time[ip] = 0  # Track when the last spike message should be cleared
-
-        # Check if there are enough pings to calculate spikes
-        if len(self.last_five_pings[ip]) < 5:
-            return "Insufficient Data"
-
-        # Calculate average and lowest recent pings
-        recent_pings = self.last_five_pings[ip]
-        average_recent = sum(recent_pings) / len(recent_pings)
-        lowest_recent = min(recent_pings)
-
-        # Detect spikes
-        spikes = [
-            ping for ping in recent_pings
-            if ping > average_recent * (1 + self.spike_threshold_percentage)
-        ]
-
-        # Update only if there’s a spike and 10 seconds have passed or if a new spike is higher than the previous
-        if spikes:
-            highest_spike = max(spikes)
-            if (current_time - self.last_spike_time[ip] >= 10) or highest_spike > self.get_previous_spike(ip):
-                self.last_spike_time[ip] = current_time
-                self.store_previous_spike(ip, highest_spike)
-                self.spike_detected[ip] = True  # Set spike detected flag
-                self.spike_display_time[ip] = current_time + 10  # Set time to clear spike message
-                spike_details = f"{self.servers[ip]} - Spike Detected - {highest_spike}ms, passed threshold by 15% over Lowest Ping({lowest_recent}ms) and Average Ping({average_recent:.2f}ms) - 10s"
-                self.spiked_pings[ip] += 1
-                logger.warning(spike_details[:-6])
-                return spike_details
-
-        # If a spike has been detected previously, keep the message until 10 seconds have passed
-        if self.spike_detected[ip] and (current_time < self.spike_display_time[ip]):
-            remaining_time = int(self.spike_display_time[ip] - current_time)
-            return f"{self.servers[ip]} - Last Spike: {self.get_previous_spike(ip)}ms - {remaining_time}s"
-
-        # Reset the detected flag if the spike display time has passed
-        self.spike_detected[ip] = False
-        return "No Spike"
-
-    # Helper functions to get and store the previous spike
-    def get_previous_spike(self, ip):
-        return self.previous_spikes.get(ip, 0)
-
-    def store_previous_spike(self, ip, spike):
-        self.previous_spikes[ip] = spike
+            text = "Best Channels: waiting for data"
+        self.recommendation_label.config(text=text)
+
+    def update_tree(self, record):
+        ip = record["ip"]
+        values = (
+            record["server"], f"{record['ping']:.2f}ms", self.format_ms(record["lowest"]), self.format_ms(record["average"]),
+            self.format_ms(record["jitter"]), self.format_ms(record["stddev"]),
+            f"{record['loss']:.1f}%" if record["loss"] is not None else "",
+            record["total"], record["succeeded"], record["failed"], record["spiked"], record["spike"]
+        )
+        if values != self.row_values.get(ip):
+            self.tree.item(self.tree_items[ip], values=values)
+            self.row_values[ip] = values
+
+    @staticmethod
+    def format_ms(value):
+        return f"{value:.2f}" if value is not None else ""
 
     def export_log(self):
         # Get the current date for filename suggestion
@@ -348,23 +301,32 @@ class PingApp:
         # Only proceed if the user selected a file path
         if file_path:
             # Format the log data as text for readability
+            engine = self.engine
             log_data = []
-            for ip, name in self.servers.items():
+            for ip, name in list(engine.servers.items()):
+                if ip not in engine.total_pings:
+                    continue  # Removed by a reload while exporting
                 log_data.append(f"Server: {name}")
-                log_data.append(f"  Lowest Ping: {self.lowest_pings[ip]} ms")
-                average_ping = (
-                    int(sum(self.average_pings[ip]) / len(self.average_pings[ip]))
-                    if self.average_pings[ip] else None
-                )
-                log_data.append(f"  Average Ping: {average_ping} ms" if average_ping is not None else "  Average Ping: N/A")
-                log_data.append(f"  Total Pings: {self.total_pings[ip]}")
-                if self.succeeded_pings[ip] > 0:
-                    log_data.append(f"  Succeeded Pings: {self.succeeded_pings[ip]}")
-                if self.failed_pings[ip] > 0:
-                    log_data.append(f"  Failed Pings: {self.failed_pings[ip]}")
+                log_data.append(f"  Lowest Ping: {engine.lowest_pings[ip]} ms")
+                session_mean = engine.average_pings[ip].session_mean()
+                log_data.append(f"  Average Ping: {session_mean:.2f} ms" if session_mean is not None else "  Average Ping: N/A")
+                jitter = engine.jitter[ip].jitter
+                stddev = engine.average_pings[ip].window_stddev()
+                loss = engine.loss[ip].loss()
+                if jitter is not None:
+                    log_data.append(f"  Jitter: {jitter:.2f} ms")
+                if stddev is not None:
+                    log_data.append(f"  Std Dev: {stddev:.2f} ms")
+                if loss is not None:
+                    log_data.append(f"  Loss: {loss:.1f}% of the last {len(engine.loss[ip].outcomes)} pings")
+                log_data.append(f"  Total Pings: {engine.total_pings[ip]}")
+                if engine.succeeded_pings[ip] > 0:
+                    log_data.append(f"  Succeeded Pings: {engine.succeeded_pings[ip]}")
+                if engine.failed_pings[ip] > 0:
+                    log_data.append(f"  Failed Pings: {engine.failed_pings[ip]}")
                     log_data.append("   For more information, please check the app log file")
-                if self.spiked_pings[ip] > 0:
-                    log_data.append(f"  Spiked Pings: {self.spiked_pings[ip]}")
+                if engine.spiked_pings[ip] > 0:
+                    log_data.append(f"  Spiked Pings: {engine.spiked_pings[ip]}")
                     log_data.append("   For more information, please check the app log file")
 
                 log_data.append("")  # Blank line for separation
@@ -373,13 +335,48 @@ class PingApp:
             with open(file_path, "w") as f:
                 f.write("\n".join(log_data))
 
+    def export_samples(self):
+        """Write every raw sample with its timestamp on a background thread, the window stays responsive meanwhile."""
+        if self.exporter is not None:
+            return
+        suggested_filename = f"ping_samples_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.npz"
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".npz",
+            filetypes=[("NumPy archive (columnar)", "*.npz"), ("CSV files", "*.csv")],
+            initialfile=suggested_filename,
+            title="Export Samples"
+        )
+        if not file_path:
+            return
+
+        self.exporter = self.engine.export_samples(file_path)
+        self.export_samples_button.config(state=tk.DISABLED)
+        self.poll_export()
+
+    def poll_export(self):
+        """Show the export progress on the Tk thread until the worker is done."""
+        exporter = self.exporter
+        if not exporter.finished.is_set():
+            self.export_label.config(text=f"Exporting samples: {100 * exporter.progress:.0f}%")
+            self.master.after(200, self.poll_export)
+            return
+
+        self.exporter = None
+        self.export_samples_button.config(state=tk.NORMAL)
+        if exporter.error is not None:
+            self.export_label.config(text="")
+            messagebox.showerror("Export Samples", f"Could not export the samples: {exporter.error}")
+        else:
+            self.export_label.config(text=f"Exported {exporter.done} samples to {os.path.basename(exporter.path)}")
+
     def show_information(self):
-        info_text = "This app monitors server ping times and tracks failed and successful pings, also displays ping spikes which are considered 15% over average."
+        spike_rule = self.engine.describe_spike_rule()
+        info_text = f"This app monitors server ping times and tracks failed and successful pings, also displays ping spikes which are considered {spike_rule}."
         messagebox.showinfo("Information", info_text)
 
 
 if __name__ == "__main__":
-    logger.add("App_Log_{time}.log", rotation="30 days", backtrace=True, enqueue=False, catch=True)
+    setup_logging("App_Log_{time}.log")
     root = tk.Tk()
     app = PingApp(root)
     root.mainloop()
@@ -0,0 +1,201 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from loguru import logger
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# Histogram upper bounds in seconds, the last bucket is +Inf
+LATENCY_BUCKETS = (0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class LatencyHistogram:
+    """Latency bucket counts and sum of one server. Never changed once published: every probe builds a new one and
+    swaps the reference, so a render always sees buckets, count and sum of the same probes."""
+
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, counts=None, total=0.0):
+        self.counts = counts or [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = total
+
+    def added(self, latency):
+        counts = self.counts.copy()
+        counts[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        return LatencyHistogram(counts, self.sum + latency)
+
+
+EMPTY_HISTOGRAM = LatencyHistogram()
+
+
+class MetricsExporter:
+    """Engine subscriber keeping the latest per-server values and re-rendering an OpenMetrics snapshot in the background."""
+
+    def __init__(self, engine, render_interval=1.0):
+        self.engine = engine
+        self.render_interval = render_interval
+        self.latest = {}  # ip -> last record
+        self.histograms = {}  # ip -> LatencyHistogram, from its first successful probe
+        self.dirty = True
+        self.snapshot = self.render().encode()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __call__(self, record):
+        """Probe thread path: plain assignments and one small histogram copy, no locks and no rendering."""
+        ip = record["ip"]
+        self.latest[ip] = record
+        if record["ping"] is not None:
+            latency = record["ping"] / 1000
+            # A copy of 13 counts per probe, swapped in with one assignment
+            self.histograms[ip] = self.histograms.get(ip, EMPTY_HISTOGRAM).added(latency)
+        self.dirty = True
+
+    def reset(self, _=None):
+        """Forget the records and histograms, called on the probe thread after the engine reset its counters for a
+        new network interface, so probes_total and the histogram _count start over together."""
+        self.latest = {}
+        self.histograms = {}
+        self.dirty = True
+
+    def sync_servers(self, servers):
+        """Drop the histograms of servers removed from game_servers.json, a server added back starts from zero."""
+        self.latest = {ip: record for ip, record in self.latest.items() if ip in servers}
+        self.histograms = {ip: histogram for ip, histogram in self.histograms.items() if ip in servers}
+        self.dirty = True
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._render_loop, name="MetricsRenderer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _render_loop(self):
+        while not self._stopped.wait(self.render_interval):
+            if self.dirty:
+                self.dirty = False
+                try:
+                    # Swapping the reference is atomic, scrapes always see a complete snapshot
+                    self.snapshot = self.render().encode()
+                except Exception as e:
+                    logger.error(f"Error rendering metrics: {e}")
+
+    def render(self):
+        servers = self.engine.servers
+        histograms = self.histograms  # Read once, reset() swaps in a new dict
+        records = {ip: record for ip, record in list(self.latest.items()) if ip in servers}  # Skip removed servers
+        lines = []
+
+        def labels(ip, **extra):
+            pairs = {"server": servers[ip], "ip": ip, **extra}
+            return ",".join(f'{key}="{escape_label(value)}"' for key, value in pairs.items())
+
+        for name, key, help_text in (
+            ("maplestory_ping_current_seconds", "ping", "Latency of the latest successful probe."),
+            ("maplestory_ping_lowest_seconds", "lowest", "Lowest latency since the interface was selected."),
+            ("maplestory_ping_average_seconds", "average", "Average latency of the session."),
+            ("maplestory_ping_jitter_seconds", "jitter", "RFC 3550 interarrival jitter of the probe latency."),
+            ("maplestory_ping_stddev_seconds", "stddev", "Standard deviation of the latency over the sample window."),
+        ):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"# UNIT {name} seconds")
+            lines.append(f"# HELP {name} {help_text}")
+            for ip, record in records.items():
+                if record[key] is not None:
+                    lines.append(f"{name}{{{labels(ip)}}} {record[key] / 1000}")
+
+        lines.append("# TYPE maplestory_ping_loss_ratio gauge")
+        lines.append("# UNIT maplestory_ping_loss_ratio ratio")
+        lines.append("# HELP maplestory_ping_loss_ratio Share of failed probes over the loss window.")
+        for ip, record in records.items():
+            if record["loss"] is not None:
+                lines.append(f"maplestory_ping_loss_ratio{{{labels(ip)}}} {record['loss'] / 100}")
+
+        lines.append("# TYPE maplestory_ping_up gauge")
+        lines.append("# HELP maplestory_ping_up 1 while the server is probed normally, 0 while its circuit breaker is backing off.")
+        for ip, record in records.items():
+            lines.append(f"maplestory_ping_up{{{labels(ip)}}} {1 if record['state'] == 'closed' else 0}")
+
+        lines.append("# TYPE maplestory_ping_probes counter")
+        lines.append("# HELP maplestory_ping_probes Probes by result since the interface was selected.")
+        for ip, record in records.items():
+            for result in ("total", "succeeded", "failed", "spiked"):
+                lines.append(f"maplestory_ping_probes_total{{{labels(ip, result=result)}}} {record[result]}")
+
+        lines.append("# TYPE maplestory_ping_latency_seconds histogram")
+        lines.append("# UNIT maplestory_ping_latency_seconds seconds")
+        lines.append("# HELP maplestory_ping_latency_seconds Connect latency of successful probes since the interface was selected.")
+        for ip in records:
+            histogram = histograms.get(ip)
+            if histogram is None:
+                continue  # No successful probe yet
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"maplestory_ping_latency_seconds_bucket{{{labels(ip, le=bound)}}} {cumulative}")
+            lines.append(f"maplestory_ping_latency_seconds_count{{{labels(ip)}}} {cumulative}")
+            lines.append(f"maplestory_ping_latency_seconds_sum{{{labels(ip)}}} {histogram.sum}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving the exporter snapshot on /metrics."""
+
+    def __init__(self, engine, host="127.0.0.1", port=9464, render_interval=1.0):
+        self.exporter = MetricsExporter(engine, render_interval)
+        engine.subscribe(self.exporter)
+        engine.subscribe_interface(self.exporter.reset)
+        engine.subscribe_catalog(self.exporter.sync_servers)
+        exporter = self.exporter
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.snapshot
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the app log
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.server_address = self.httpd.server_address  # Port 0 picks a free port, the real one is here
+        self._thread = None
+
+    def start(self):
+        self.exporter.start()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{self.server_address[0]}:{self.server_address[1]}/metrics")
+
+    def stop(self):
+        self.exporter.stop()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# Start the metrics endpoint when "metrics_port" is set in config.json, returns None otherwise
+def start_metrics_server(engine, config):
+    port = config.get("metrics_port")
+    if port is None:
+        return None
+    try:
+        server = MetricsServer(engine, config.get("metrics_host", "127.0.0.1"), port, config.get("metrics_render_interval", 1.0))
+    except OSError as e:
+        logger.error(f"Could not start metrics server on port {port}: {e}")
+        return None
+    server.start()
+    return server
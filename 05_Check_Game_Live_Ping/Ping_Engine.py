@@ -0,0 +1,413 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from loguru import logger
+from Metrics_Server import start_metrics_server
+from Probe_Scheduler import ProbeScheduler
+from Sample_Buffer import LossWindow, SampleRing
+from Sample_Export import SampleExporter
+from Spike_Detectors import create_detector
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from App_Logging import LogLimiter, setup_logging  # noqa: E402
+from Network_Interface import InterfaceResolver, InterfaceWatcher  # noqa: E402
+from Prober import DEFAULT_CONCURRENCY  # noqa: E402
+from Server_Catalog import CatalogWatcher, ServerCatalog, as_catalog  # noqa: E402
+from Server_Health import ServerHealth  # noqa: E402
+from Stats import JitterEstimator  # noqa: E402
+from Channel_Ranker import ChannelRanker, describe_channels  # noqa: E402
+
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class PingEngine:
+    """UI-free live ping monitor: schedules probes, keeps per-server statistics and publishes a record per probe."""
+
+    def __init__(self, servers, config):
+        # servers: ServerCatalog, or a plain {ip: name} dict
+        self.catalog = as_catalog(servers)
+        self.servers = self.catalog.names()
+        self.config = config
+        self.vpn_keywords = config.get("vpn_keywords", [])
+        self.current_interface = None
+        self.subscribers = []
+        self.interface_subscribers = []
+        self.catalog_subscribers = []
+
+        # Interface of the route towards the game servers, re-checked in the background while probing
+        interface_check_interval = config.get("interface_check_interval", 2.0)
+        self.resolver = InterfaceResolver(self.vpn_keywords, next(iter(self.servers), None), ttl=interface_check_interval)
+        self.interface_watcher = InterfaceWatcher(self.resolver, self.on_interface_change, interface_check_interval)
+
+        # Bounded per-server sample history, each sized to hold the retention window at that server's probe interval
+        self.average_pings = {}
+        self.sample_lock = threading.Lock()  # Held by the probe thread to append, and by exports while reading a buffer
+        # One streaming spike detector per server, algorithm selected by "spike_detection" in config.json
+        self.spike_settings = config.get("spike_detection", {})
+        self.spike_detectors = {}
+        # RFC 3550 jitter and loss over the last "loss_window" probes
+        self.jitter = {}
+        self.loss = {}
+        # Circuit breaker and SRTT/RTTVAR connect timeout, "probe_timeout" is the upper bound
+        self.health_settings = {"max_timeout": config.get("probe_timeout", 2), **config.get("circuit_breaker", {})}
+        self.health = {}
+        # Failures and spikes of a server beyond a few per minute are only counted and summarized
+        self.log_limiter = LogLimiter(**config.get("log_rate_limit", {}))
+        for ip in self.servers.keys():
+            self.add_server_state(ip)
+        self.reset_stats()
+
+        self.scheduler = self.create_scheduler()
+        # game_servers.json is reloaded while pinging when it changes on disk
+        self.catalog_watcher = CatalogWatcher(self.catalog, self.on_catalog_change, config.get("catalog_check_interval", 2.0))
+
+        # Best channels over the recent window, kept up to date as the records are published
+        self.ranker = ChannelRanker.from_config(self, config.get("recommender"))
+        self.subscribe(self.ranker)
+        self.subscribe_interface(self.ranker.reset)
+        self.subscribe_catalog(self.ranker.sync_servers)
+
+    def add_server_state(self, ip):
+        self.average_pings[ip] = SampleRing(self.get_sample_capacity(ip))
+        self.spike_detectors[ip] = create_detector(self.spike_settings)
+        self.jitter[ip] = JitterEstimator()
+        self.loss[ip] = LossWindow(self.config.get("loss_window", 100))
+        self.health[ip] = ServerHealth(**self.health_settings)
+
+    def remove_server_state(self, ip):
+        for state in (self.average_pings, self.spike_detectors, self.jitter, self.loss, self.health,
+                      self.lowest_pings, self.total_pings, self.failed_pings, self.succeeded_pings, self.spiked_pings,
+                      self.last_spike_time, self.previous_spikes, self.spike_detected, self.spike_display_time):
+            state.pop(ip, None)
+
+    def reset_stats(self):
+        self.lowest_pings = {}
+        self.total_pings = {}
+        self.failed_pings = {}
+        self.succeeded_pings = {}
+        self.spiked_pings = {}
+        # Initialize last spike time tracker for each IP
+        self.last_spike_time = {}
+        # Initialize previous spikes tracker for each IP
+        self.previous_spikes = {}
+        # Initialize spike detection state
+        self.spike_detected = {}  # This will hold the spike detection status for each server
+        self.spike_display_time = {}
+        for ip in self.servers.keys():
+            self.reset_server_stats(ip)
+
+    def reset_server_stats(self, ip):
+        self.lowest_pings[ip] = None
+        self.total_pings[ip] = 0
+        self.failed_pings[ip] = 0
+        self.succeeded_pings[ip] = 0
+        self.spiked_pings[ip] = 0
+        self.spike_detectors[ip].reset()  # The baseline of the previous interface doesn't apply anymore
+        self.jitter[ip].reset()
+        self.loss[ip].clear()
+        self.health[ip].reset()  # Round trip times and reachability of the previous route don't apply
+
+    def get_sample_capacity(self, ip):
+        retention = self.config.get("sample_retention_seconds", 3600)
+        interval = self.config.get("probe_intervals", {}).get(self.servers[ip], self.config.get("probe_interval", 1.0))
+        return max(int(retention / interval), 1)
+
+    def get_intervals(self):
+        # Per-server intervals are configured by server name, e.g. {"CH 01": 0.5}
+        names = {name: ip for ip, name in self.servers.items()}
+        return {names[name]: interval for name, interval in self.config.get("probe_intervals", {}).items() if name in names}
+
+    def create_scheduler(self):
+        return ProbeScheduler(
+            self.catalog.ports(),
+            self.on_probe_result,
+            interval=self.config.get("probe_interval", 1.0),
+            timeout=self.config.get("probe_timeout", 2),
+            concurrency=self.config.get("probe_concurrency", DEFAULT_CONCURRENCY),
+            intervals=self.get_intervals(),
+            health=self.health,
+        )
+
+    def recommend(self, k=3):
+        """The `k` best channels right now, best first, see ChannelRanker.top()."""
+        return self.ranker.top(k)
+
+    def export_samples(self, path, on_progress=None, on_done=None):
+        """Write every buffered sample to `path` (.npz or .csv) on a background thread, returns the started SampleExporter."""
+        return SampleExporter(self, path, on_progress, on_done).start()
+
+    def subscribe(self, callback):
+        """Register callback(record), called from the probe thread for every finished probe."""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def subscribe_interface(self, callback):
+        """Register callback(interface), called after the statistics were reset for a new network interface."""
+        self.interface_subscribers.append(callback)
+
+    def subscribe_catalog(self, callback):
+        """Register callback(servers), called with the new {ip: name} after game_servers.json was reloaded."""
+        self.catalog_subscribers.append(callback)
+
+    def start(self):
+        logger.info("Starting to ping servers...")
+        self.scheduler.start()
+        self.interface_watcher.start()
+        self.catalog_watcher.start()
+
+    def stop(self):
+        logger.info("Stopping ping process...")
+        self.catalog_watcher.stop()
+        self.interface_watcher.stop()
+        self.scheduler.stop()
+        self.log_limiter.stop()
+
+    def is_running(self):
+        return self.scheduler.is_running()
+
+    def join(self, timeout=None):
+        self.scheduler.join(timeout)
+
+    def update_network_interface(self):
+        """Re-detect the interface, resetting the statistics when it changed. Returns (interface, changed)."""
+        interface = self.get_default_network_interface()
+        changed = interface != self.current_interface
+        if changed:
+            self.current_interface = interface
+            self.reset_stats()
+        return interface, changed
+
+    def on_interface_change(self, _):
+        """Called by the interface watcher thread, the reset runs on the probe thread between two results."""
+        self.scheduler.call_soon(self.apply_interface_change)
+
+    def apply_interface_change(self):
+        interface, changed = self.update_network_interface()
+        if changed:
+            for callback in self.interface_subscribers:
+                try:
+                    callback(interface)
+                except Exception as e:
+                    logger.error(f"Error in interface subscriber: {e}")
+
+    def on_catalog_change(self, catalog):
+        """Called by the catalog watcher thread, servers are swapped on the probe thread between two results."""
+        self.scheduler.call_soon(lambda: self.apply_catalog(catalog))
+
+    def apply_catalog(self, catalog):
+        removed = self.servers.keys() - catalog.records.keys()
+        added = catalog.records.keys() - self.servers.keys()
+        for ip in removed:
+            self.remove_server_state(ip)
+        self.catalog = catalog
+        self.servers = catalog.names()
+        for ip in added:
+            self.add_server_state(ip)
+            self.reset_server_stats(ip)
+        # Unchanged servers keep their statistics and their probe clock
+        self.scheduler.set_targets(catalog.ports(), self.get_intervals(), self.health)
+        logger.info(f"Server list updated: {len(added)} added, {len(removed)} removed, {len(self.servers)} servers")
+
+        for callback in self.catalog_subscribers:
+            try:
+                callback(self.servers)
+            except Exception as e:
+                logger.error(f"Error in server list subscriber: {e}")
+
+    def get_default_network_interface(self):
+        try:
+            interface = self.resolver.resolve(refresh=True)
+            if interface is None:
+                logger.warning("No Active Interface found")
+                return "No active interface found"
+            if self.resolver.is_vpn(interface):
+                if f"VPN Detected: {interface}" != self.current_interface:
+                    logger.info(f"VPN Detected: {interface}")
+                return f"VPN Detected: {interface}"
+            if interface != self.current_interface:
+                logger.info(f"No VPN detected, using {interface}")
+            return interface
+        except Exception as e:
+            logger.error("Error fetching interface: " + str(e))
+            return "Error fetching interface: " + str(e)
+
+    def on_probe_result(self, ip, ping_time):
+        """Called by the scheduler thread for every finished probe."""
+        current_time = time.time()
+        health = self.health[ip]
+        if ping_time is None:
+            opened = health.record_failure(current_time)
+            self.log_limiter.log(self.servers[ip], "failures", "ERROR", f"Failed to ping server: {self.servers[ip]}")
+            if opened:
+                logger.error(f"{self.servers[ip]} unreachable after {health.failures} failed pings, retrying in {health.backoff:.0f}s")
+            self.failed_pings[ip] += 1
+            self.loss[ip].add(True)
+            spike_ping = ""
+        else:
+            ping_time = round(ping_time, 2)  # The time taken for the ping in milliseconds
+            outage = health.record_success(ping_time, current_time)
+            if outage:
+                logger.info(f"{self.servers[ip]} reachable again after {outage} failed pings")
+            self.loss[ip].add(False)
+            self.jitter[ip].add(ping_time)
+            self.total_pings[ip] += 1
+            self.succeeded_pings[ip] += 1
+            if self.lowest_pings[ip] is None or ping_time < self.lowest_pings[ip]:
+                self.lowest_pings[ip] = ping_time
+            with self.sample_lock:
+                self.average_pings[ip].append(current_time, ping_time)
+            spike_ping = self.detect_ping_spike(ip, current_time, ping_time)
+            if spike_ping == "No Spike":
+                spike_ping = ""  # Reset spike message if no spike is detected
+
+        self.publish(self.make_record(ip, current_time, ping_time, spike_ping))
+
+    def make_record(self, ip, timestamp, ping_time, spike_ping):
+        samples = self.average_pings[ip]
+        average_ping = samples.session_mean()
+        stddev = samples.window_stddev()
+        jitter = self.jitter[ip].jitter
+        loss = self.loss[ip].loss()
+        return {
+            "timestamp": timestamp,
+            "interface": self.current_interface,
+            "ip": ip,
+            "server": self.servers[ip],
+            "ping": ping_time,
+            "lowest": self.lowest_pings[ip],
+            "average": round(average_ping, 2) if average_ping is not None else None,
+            "jitter": round(jitter, 2) if jitter is not None else None,
+            "stddev": round(stddev, 2) if stddev is not None else None,
+            "loss": round(loss, 1) if loss is not None else None,
+            "total": self.total_pings[ip],
+            "succeeded": self.succeeded_pings[ip],
+            "failed": self.failed_pings[ip],
+            "spiked": self.spiked_pings[ip],
+            "spike": spike_ping,
+            "state": self.health[ip].state,
+            "timeout": round(self.health[ip].timeout(), 3),
+        }
+
+    def publish(self, record):
+        for callback in self.subscribers:
+            try:
+                callback(record)
+            except Exception as e:
+                logger.error(f"Error in ping record subscriber: {e}")
+
+    def detect_ping_spike(self, ip, current_time, ping_time):
+        # Initialize last spike time and spike detected flag if not set for this IP
+        if ip not in self.last_spike_time:
+            self.last_spike_time[ip] = 0
+        if ip not in self.spike_detected:
+            self.spike_detected[ip] = False
+            self.spike_display_time[ip] = 0  # Track when the last spike message should be cleared
+
+        detector = self.spike_detectors[ip]
+        spike = detector.update(ping_time)
+
+        # Check if there are enough pings to calculate spikes
+        if not detector.ready:
+            return "Insufficient Data"
+
+        # Update only if there’s a spike and 10 seconds have passed or if a new spike is higher than the previous
+        if spike:
+            if (current_time - self.last_spike_time[ip] >= 10) or spike.value > self.get_previous_spike(ip):
+                self.last_spike_time[ip] = current_time
+                self.store_previous_spike(ip, spike.value)
+                self.spike_detected[ip] = True  # Set spike detected flag
+                self.spike_display_time[ip] = current_time + 10  # Set time to clear spike message
+                spike_details = f"{self.servers[ip]} - Spike Detected - {spike.value}ms, {spike.detail} - 10s"
+                self.spiked_pings[ip] += 1
+                self.log_limiter.log(self.servers[ip], "spikes", "WARNING", spike_details[:-6])
+                return spike_details
+
+        # If a spike has been detected previously, keep the message until 10 seconds have passed
+        if self.spike_detected[ip] and (current_time < self.spike_display_time[ip]):
+            remaining_time = int(self.spike_display_time[ip] - current_time)
+            return f"{self.servers[ip]} - Last Spike: {self.get_previous_spike(ip)}ms - {remaining_time}s"
+
+        # Reset the detected flag if the spike display time has passed
+        self.spike_detected[ip] = False
+        return "No Spike"
+
+    # Helper functions to get and store the previous spike
+    def get_previous_spike(self, ip):
+        return self.previous_spikes.get(ip, 0)
+
+    def store_previous_spike(self, ip, spike):
+        self.previous_spikes[ip] = spike
+
+    def describe_spike_rule(self):
+        return create_detector(self.spike_settings).describe()
+
+
+class JsonLinesWriter:
+    """Engine subscriber writing every record as one JSON line, flushed so the output can be tailed."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __call__(self, record):
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+
+# Stderr keeps the JSON lines on stdout parseable
+def print_recommendation(engine, k):
+    lines = describe_channels(engine.recommend(k))
+    print("\n".join(["Best channels:"] + lines) if lines else "Best channels: not enough data yet", file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless live ping monitor, streams every probe result as a JSON line.")
+    parser.add_argument("--config", default="config.json", help="Path of config.json")
+    parser.add_argument("--servers", default="game_servers.json", help="Path of game_servers.json")
+    parser.add_argument("--output", help="Append JSON lines to this file instead of stdout")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after this many seconds, 0 runs until interrupted")
+    parser.add_argument("--recommend", type=int, default=0, metavar="K", help="Print the K best channels to stderr every 10 seconds and on exit")
+    args = parser.parse_args()
+
+    setup_logging("App_Log_{time}.log")
+
+    engine = PingEngine(ServerCatalog.load(args.servers), load_json(args.config))
+    interface, _ = engine.update_network_interface()
+    logger.info(f"Current Network Interface: {interface}")
+
+    output = open(args.output, "a") if args.output else sys.stdout
+    engine.subscribe(JsonLinesWriter(output))
+    metrics_server = start_metrics_server(engine, engine.config)
+
+    try:
+        engine.start()
+        deadline = time.monotonic() + args.duration if args.duration > 0 else None
+        next_recommendation = time.monotonic() + 10
+        while engine.is_running() and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.2)
+            if args.recommend and time.monotonic() >= next_recommendation:
+                print_recommendation(engine, args.recommend)
+                next_recommendation += 10
+    except KeyboardInterrupt:
+        logger.info("Gracefully exiting...")
+    finally:
+        engine.stop()
+        engine.join()
+        if args.recommend:
+            print_recommendation(engine, args.recommend)
+        if metrics_server is not None:
+            metrics_server.stop()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from Prober import DEFAULT_CONCURRENCY, tcp_connect_time  # noqa: E402
+
+
+class ProbeScheduler:
+    """Long-lived fixed-rate prober, every server runs on its own clock on one persistent event loop."""
+
+    def __init__(self, targets, on_result, interval=1.0, timeout=2, concurrency=DEFAULT_CONCURRENCY, intervals=None, health=None):
+        # targets: {ip: port}, intervals: optional {ip: seconds} overriding the default interval,
+        # health: optional {ip: ServerHealth} giving the connect timeout and skipping servers with an open circuit breaker
+        self.targets = dict(targets)
+        self.on_result = on_result
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.intervals = intervals or {}
+        self.health = health or {}
+        self.missed_ticks = {ip: 0 for ip in self.targets}
+        self.skipped_ticks = {ip: 0 for ip in self.targets}
+
+        self.loop = None
+        self.thread = None
+        self._tasks = {}  # ip -> task of its probe clock
+        self._semaphore = None
+        self._stopped = None
+        self._stop_requested = False
+
+    def start(self):
+        if self.is_running():
+            if not self._stop_requested:
+                return
+            self.join()  # A stop is still winding down, wait for it before starting a fresh loop
+        self._stop_requested = False
+        self.loop = asyncio.new_event_loop()
+        self._stopped = asyncio.Event()
+        self.thread = threading.Thread(target=self._run_loop, name="ProbeScheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Cancel every server clock, in-flight probes are abandoned and the loop thread exits."""
+        if self.is_running():
+            self._stop_requested = True
+            self.loop.call_soon_threadsafe(self._stopped.set)
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def call_soon(self, callback):
+        """Run callback on the probe loop thread, or right away when the scheduler isn't running."""
+        if self.is_running():
+            try:
+                self.loop.call_soon_threadsafe(callback)
+                return
+            except RuntimeError:
+                pass  # The loop closed in the meantime
+        callback()
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            logger.error(f"Probe scheduler stopped unexpectedly: {e}")
+        finally:
+            self.loop.close()
+
+    async def _main(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        start = self.loop.time()
+
+        # Spread the first probe of every server evenly over one interval so they don't leave in a burst
+        count = max(len(self.targets), 1)
+        self._tasks = {
+            ip: asyncio.ensure_future(self._run_target(ip, port, start + self.intervals.get(ip, self.interval) * index / count, self._semaphore))
+            for index, (ip, port) in enumerate(self.targets.items())
+        }
+
+        await self._stopped.wait()
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def set_targets(self, targets, intervals=None, health=None):
+        """Replace the probed servers. Must run on the loop thread (see call_soon) while the scheduler is running.
+
+        Clocks of unchanged servers keep running, removed ones are cancelled and new ones start within one interval.
+        """
+        targets = dict(targets)
+        changed = {ip for ip in self.targets.keys() | targets.keys() if self.targets.get(ip) != targets.get(ip)}
+        self.targets = targets
+        self.intervals = intervals or {}
+        self.health = health or {}
+        for ip in targets:
+            self.missed_ticks.setdefault(ip, 0)
+            self.skipped_ticks.setdefault(ip, 0)
+        if not self.is_running() or self._semaphore is None:
+            return
+
+        for ip in changed:
+            task = self._tasks.pop(ip, None)
+            if task is not None:
+                task.cancel()
+        added = [ip for ip in changed if ip in targets]
+        start = self.loop.time()
+        for index, ip in enumerate(added):
+            first_fire = start + self.intervals.get(ip, self.interval) * index / len(added)
+            self._tasks[ip] = asyncio.ensure_future(self._run_target(ip, targets[ip], first_fire, self._semaphore))
+
+    async def _run_target(self, ip, port, first_fire, semaphore):
+        interval = self.intervals.get(ip, self.interval)
+        health = self.health.get(ip)
+        next_fire = first_fire
+
+        while True:
+            delay = next_fire - self.loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if health is not None and not health.allow(time.time()):
+                self.skipped_ticks[ip] += 1  # Backing off a server that keeps failing
+            else:
+                async with semaphore:
+                    latency = await tcp_connect_time(ip, port, health.timeout() if health is not None else self.timeout)
+
+                try:
+                    self.on_result(ip, latency)
+                except Exception as e:
+                    logger.error(f"Error handling probe result for {ip}: {e}")
+
+            # Stay on the fixed grid, a probe that overran its slot skips the missed ticks instead of drifting
+            next_fire += interval
+            now = self.loop.time()
+            if next_fire < now:
+                skipped = int((now - next_fire) // interval) + 1
+                self.missed_ticks[ip] += skipped
+                next_fire += skipped * interval
@@ -0,0 +1,137 @@
+import math
+from array import array
+from collections import deque
+
+
+class SampleRing:
+    """Fixed-capacity ring of (timestamp, latency ms) samples with O(1) window mean/min/stddev and session totals."""
+
+    __slots__ = ("capacity", "timestamps", "values", "start", "size", "sequence",
+                 "window_sum", "window_sq", "window_min", "session_count", "session_sum", "session_min")
+
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1)
+        # Preallocated typed arrays, memory stays constant no matter how long the session runs
+        self.timestamps = array('d', bytes(8 * self.capacity))
+        self.values = array('f', bytes(4 * self.capacity))
+        self.start = 0
+        self.size = 0
+        self.sequence = 0  # Total number of samples ever appended
+        self.window_sum = 0.0
+        self.window_sq = 0.0
+        self.window_min = deque()  # Monotonic (sequence, value) pairs, front is the minimum of the window
+        self.session_count = 0
+        self.session_sum = 0.0
+        self.session_min = None
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, value):
+        if self.size == self.capacity:
+            # Evict the oldest sample before overwriting its slot
+            oldest = self.values[self.start]
+            self.window_sum -= oldest
+            self.window_sq -= oldest * oldest
+            if self.window_min and self.window_min[0][0] == self.sequence - self.capacity:
+                self.window_min.popleft()
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        else:
+            index = (self.start + self.size) % self.capacity
+            self.size += 1
+
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+        stored = self.values[index]  # Use the float32 value so sums and minimums match what is kept
+
+        self.window_sum += stored
+        self.window_sq += stored * stored
+        while self.window_min and self.window_min[-1][1] >= stored:
+            self.window_min.pop()
+        self.window_min.append((self.sequence, stored))
+        self.sequence += 1
+
+        self.session_count += 1
+        self.session_sum += stored
+        if self.session_min is None or stored < self.session_min:
+            self.session_min = stored
+
+    def window_mean(self):
+        return self.window_sum / self.size if self.size else None
+
+    def window_stddev(self):
+        if self.size < 2:
+            return None
+        mean = self.window_sum / self.size
+        variance = (self.window_sq - self.size * mean * mean) / (self.size - 1)
+        return math.sqrt(max(variance, 0.0))  # Running sums can go a hair negative through rounding
+
+    def window_minimum(self):
+        return self.window_min[0][1] if self.window_min else None
+
+    def session_mean(self):
+        return self.session_sum / self.session_count if self.session_count else None
+
+    def latest(self):
+        return self.values[(self.start + self.size - 1) % self.capacity] if self.size else None
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+        self.window_sum = 0.0
+        self.window_sq = 0.0
+        self.window_min.clear()
+        self.session_count = 0
+        self.session_sum = 0.0
+        self.session_min = None
+
+    def oldest_sequence(self):
+        """Sequence number of the oldest sample still held, samples are numbered from 0 in append order."""
+        return self.sequence - self.size
+
+    def segments(self, first=None, limit=None):
+        """Oldest-first memoryview slices of (timestamps, values), at most two per array, nothing is copied.
+
+        `first` starts at that sequence number instead of the oldest sample (older ones are gone), `limit` caps the count.
+        """
+        offset = max(first - self.oldest_sequence(), 0) if first is not None else 0
+        count = max(self.size - offset, 0)
+        if limit is not None:
+            count = min(count, limit)
+        start = (self.start + offset) % self.capacity
+        end = start + count
+        timestamps = memoryview(self.timestamps)
+        values = memoryview(self.values)
+        if end <= self.capacity:
+            return [(timestamps[start:end], values[start:end])]
+        wrapped = end - self.capacity
+        return [(timestamps[start:], values[start:]), (timestamps[:wrapped], values[:wrapped])]
+
+    def __iter__(self):
+        for timestamps, values in self.segments():
+            yield from zip(timestamps, values)
+
+
+class LossWindow:
+    """Success/failure of the last `size` probes with a running failure count, loss percentage in O(1)."""
+
+    __slots__ = ("outcomes", "failures")
+
+    def __init__(self, size=100):
+        self.outcomes = deque(maxlen=size)
+        self.failures = 0
+
+    def add(self, failed):
+        if len(self.outcomes) == self.outcomes.maxlen and self.outcomes[0]:
+            self.failures -= 1
+        self.outcomes.append(failed)
+        if failed:
+            self.failures += 1
+
+    def loss(self):
+        return 100 * self.failures / len(self.outcomes) if self.outcomes else None
+
+    def clear(self):
+        self.outcomes.clear()
+        self.failures = 0
@@ -0,0 +1,141 @@
+import json
+import sys
+import threading
+import time
+import zipfile
+from loguru import logger
+
+# Samples formatted per lock hold by the CSV writer, the probe thread waits at most this long to append
+CSV_CHUNK = 4096
+# Samples copied per lock hold for the .npz columns, a plain memory copy so it can be larger
+NPZ_CHUNK = 65536
+_BYTE_ORDER = "<" if sys.byteorder == "little" else ">"
+
+
+def npy_header(dtype, count):
+    """Header of a version 1.0 .npy file holding a 1-D array of `count` items, padded to 64 bytes."""
+    header = f"{{'descr': '{_BYTE_ORDER}{dtype}', 'fortran_order': False, 'shape': ({count},), }}"
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header
+
+
+def write_npy(archive, name, dtype, count, views):
+    with archive.open(name, "w", force_zip64=True) as f:
+        f.write(npy_header(dtype, count))
+        for view in views:
+            f.write(view)  # The ring buffer's memory goes to the file as is
+
+
+class SampleExporter:
+    """Background thread writing every sample of the engine's ring buffers with its timestamp.
+
+    `.npz` (default): a NumPy archive with `<server>/timestamp` (float64, epoch seconds) and `<server>/latency_ms`
+    (float32) per server plus metadata.json, written straight from the buffers. `numpy.load(path)` reads it.
+    `.csv`: one `timestamp,server,ip,latency_ms` row per sample, readable anywhere.
+
+    The buffers are only locked while a chunk of samples is copied (or a CSV chunk formatted), never during file I/O.
+    Progress is in `done`/`total`.
+    """
+
+    def __init__(self, engine, path, on_progress=None, on_done=None):
+        self.engine = engine
+        self.path = path
+        self.format = "csv" if path.lower().endswith(".csv") else "npz"
+        self.on_progress = on_progress  # on_progress(done, total), called from the export thread
+        self.on_done = on_done  # on_done(exporter), called from the export thread when finished or failed
+        self.total = 0
+        self.done = 0
+        self.lost = 0  # Samples overwritten by new ones before the writer reached them
+        self.error = None
+        self.finished = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="SampleExport", daemon=True)
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    @property
+    def progress(self):
+        return min(self.done / self.total, 1.0) if self.total else 1.0
+
+    def _run(self):
+        started = time.monotonic()
+        # Rings of servers removed by a reload meanwhile are still readable through these references
+        servers = [(ip, name, self.engine.average_pings[ip]) for ip, name in list(self.engine.servers.items()) if ip in self.engine.average_pings]
+        self.total = sum(len(ring) for _, _, ring in servers)
+        try:
+            if self.format == "csv":
+                self._write_csv(servers)
+            else:
+                self._write_npz(servers)
+            logger.info(f"Exported {self.done} samples of {len(servers)} servers to {self.path} in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            # Whatever failed, the caller must not report the export as done
+            self.error = e
+            logger.error(f"Error exporting samples to {self.path}: {e}")
+        finally:
+            self.finished.set()
+            if self.on_done is not None:
+                self.on_done(self)
+
+    def _advance(self, count):
+        self.done += count
+        if self.on_progress is not None:
+            self.on_progress(self.done, self.total)
+
+    def _copy_columns(self, ring):
+        """Bytes of the timestamp and latency columns of `ring`, copied in NPZ_CHUNK pieces per lock hold."""
+        timestamps, values = [], []
+        with self.engine.sample_lock:
+            position, end = ring.oldest_sequence(), ring.sequence
+        while position < end:
+            with self.engine.sample_lock:
+                first = min(max(position, ring.oldest_sequence()), end)
+                count = 0
+                for chunk_timestamps, chunk_values in ring.segments(first, min(NPZ_CHUNK, end - first)):
+                    timestamps.append(bytes(chunk_timestamps))
+                    values.append(bytes(chunk_values))
+                    count += len(chunk_values)
+            self.lost += first - position
+            position = first + count
+            if not count:
+                break
+        return timestamps, values, sum(len(chunk) for chunk in values) // 4
+
+    def _write_npz(self, servers):
+        metadata = {"interface": self.engine.current_interface, "exported_at": time.time(), "servers": []}
+        with zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for ip, name, ring in servers:
+                # The probe thread only waits for the copies, the file is written without the lock
+                timestamps, values, count = self._copy_columns(ring)
+                write_npy(archive, f"{name}/timestamp.npy", "f8", count, timestamps)
+                write_npy(archive, f"{name}/latency_ms.npy", "f4", count, values)
+                metadata["servers"].append({"name": name, "ip": ip, "samples": count})
+                self._advance(count)
+            archive.writestr("metadata.json", json.dumps(metadata, indent=2))
+
+    def _write_csv(self, servers):
+        with open(self.path, "w", newline="") as f:
+            f.write("timestamp,server,ip,latency_ms\n")
+            for ip, name, ring in servers:
+                quoted = f'"{name.replace(chr(34), chr(34) * 2)}"' if "," in name or '"' in name else name
+                prefix = f",{quoted},{ip},"
+                with self.engine.sample_lock:
+                    position, end = ring.oldest_sequence(), ring.sequence
+                while position < end:
+                    # Text has to be formatted, so the lock is held per chunk and released for the probe thread in between
+                    with self.engine.sample_lock:
+                        first = min(max(position, ring.oldest_sequence()), end)
+                        segments = ring.segments(first, min(CSV_CHUNK, end - first))
+                        lines = [f"{timestamp:.6f}{prefix}{value:.2f}\n" for timestamps, values in segments for timestamp, value in zip(timestamps, values)]
+                    self.lost += first - position
+                    f.writelines(lines)
+                    position = first + len(lines)
+                    self._advance(len(lines))
+                    if not lines:
+                        break
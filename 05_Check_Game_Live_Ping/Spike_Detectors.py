@@ -0,0 +1,219 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from loguru import logger
+
+
+class SpikeEvent:
+    """A sample flagged as a spike, with the baseline it was compared against."""
+
+    __slots__ = ("value", "baseline", "threshold", "detail")
+
+    def __init__(self, value, baseline, threshold, detail):
+        self.value = value
+        self.baseline = baseline
+        self.threshold = threshold
+        self.detail = detail
+
+
+class SpikeDetector(ABC):
+    """Streaming spike detector, update() is O(1) per sample and returns a SpikeEvent or None."""
+
+    name = "base"
+
+    def __init__(self, warmup=5):
+        self.warmup = warmup
+        self.count = 0
+
+    @property
+    def ready(self):
+        return self.count >= self.warmup
+
+    @abstractmethod
+    def update(self, value):
+        pass
+
+    def reset(self):
+        self.count = 0
+
+    @abstractmethod
+    def describe(self):
+        pass
+
+
+class ThresholdDetector(SpikeDetector):
+    """Original rule: a sample more than `percentage` above the mean of the last `window` samples."""
+
+    name = "threshold"
+
+    def __init__(self, window=5, percentage=0.15):
+        super().__init__(warmup=window)
+        self.window = window
+        self.percentage = percentage
+        self.samples = deque(maxlen=window)
+        self.total = 0.0
+
+    def update(self, value):
+        if len(self.samples) == self.window:
+            self.total -= self.samples[0]
+        self.samples.append(value)
+        self.total += value
+        self.count += 1
+
+        if not self.ready:
+            return None
+        average = self.total / len(self.samples)
+        threshold = average * (1 + self.percentage)
+        if value > threshold:
+            return SpikeEvent(value, average, threshold, f"passed threshold by {self.percentage:.0%} over Average Ping({average:.2f}ms)")
+        return None
+
+    def reset(self):
+        super().reset()
+        self.samples.clear()
+        self.total = 0.0
+
+    def describe(self):
+        return f"{self.percentage:.0%} over the average of the last {self.window} pings"
+
+
+class EwmaDetector(SpikeDetector):
+    """TCP RTO style: smoothed RTT and mean deviation (RFC 6298), spike above srtt + k * rttvar."""
+
+    name = "ewma"
+
+    def __init__(self, alpha=0.125, beta=0.25, k=4, min_ratio=0.1, warmup=5):
+        super().__init__(warmup=warmup)
+        self.alpha = alpha
+        self.beta = beta
+        self.k = k
+        self.min_ratio = min_ratio  # Minimum band as a fraction of srtt, keeps a very steady link from alarming on noise
+        self.srtt = None
+        self.rttvar = 0.0
+
+    def update(self, value):
+        self.count += 1
+        if self.srtt is None:
+            self.srtt = value
+            self.rttvar = value / 2
+            return None
+
+        band = max(self.k * self.rttvar, self.min_ratio * self.srtt)
+        threshold = self.srtt + band
+        event = None
+        if self.ready and value > threshold:
+            event = SpikeEvent(value, self.srtt, threshold, f"above smoothed ping {self.srtt:.2f}ms + {band:.2f}ms deviation band")
+
+        self.rttvar = (1 - self.beta) * self.rttvar + self.beta * abs(self.srtt - value)
+        self.srtt = (1 - self.alpha) * self.srtt + self.alpha * value
+        return event
+
+    def reset(self):
+        super().reset()
+        self.srtt = None
+        self.rttvar = 0.0
+
+    def describe(self):
+        return f"above the smoothed ping plus {self.k}x its mean deviation"
+
+
+class ZScoreDetector(SpikeDetector):
+    """Rolling z-score over the previous `window` samples, kept with a running sum and sum of squares."""
+
+    name = "zscore"
+
+    def __init__(self, window=30, z=3.0, min_stddev=1.0):
+        super().__init__(warmup=window)
+        self.window = window
+        self.z = z
+        self.min_stddev = min_stddev  # Floor in ms, jitter below this is not meaningful for a game connection
+        self.samples = deque(maxlen=window)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, value):
+        event = None
+        if len(self.samples) == self.window:
+            mean = self.total / self.window
+            stddev = max(math.sqrt(max(self.total_sq / self.window - mean * mean, 0.0)), self.min_stddev)
+            threshold = mean + self.z * stddev
+            if value > threshold:
+                event = SpikeEvent(value, mean, threshold, f"z-score {(value - mean) / stddev:.1f} over Average Ping({mean:.2f}ms)")
+
+            oldest = self.samples[0]
+            self.total -= oldest
+            self.total_sq -= oldest * oldest
+
+        self.samples.append(value)
+        self.total += value
+        self.total_sq += value * value
+        self.count += 1
+        return event
+
+    def reset(self):
+        super().reset()
+        self.samples.clear()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def describe(self):
+        return f"{self.z} standard deviations above the last {self.window} pings"
+
+
+class CusumDetector(SpikeDetector):
+    """One-sided CUSUM change-point detector, alarms on a sustained rise rather than a single outlier."""
+
+    name = "cusum"
+
+    def __init__(self, drift=0.5, threshold=5.0, alpha=0.05, min_stddev=1.0, warmup=30):
+        super().__init__(warmup=warmup)
+        self.drift = drift  # Allowed slack per sample, in standard deviations
+        self.threshold = threshold  # Alarm level of the cumulative sum, in standard deviations
+        self.alpha = alpha  # Slow EWMA tracking the baseline mean and variance
+        self.min_stddev = min_stddev
+        self.mean = None
+        self.variance = 0.0
+        self.cusum = 0.0
+
+    def update(self, value):
+        self.count += 1
+        if self.mean is None:
+            self.mean = value
+            return None
+
+        stddev = max(math.sqrt(self.variance), self.min_stddev)
+        self.cusum = max(0.0, self.cusum + (value - self.mean) / stddev - self.drift)
+
+        event = None
+        if self.ready and self.cusum > self.threshold:
+            event = SpikeEvent(value, self.mean, self.mean + self.threshold * stddev, f"sustained rise over baseline ping {self.mean:.2f}ms (CUSUM {self.cusum:.1f})")
+            self.cusum = 0.0  # Restart accumulation so a long degradation raises periodic alarms, not one per sample
+        else:
+            # Only learn the baseline from samples that are not part of an alarm
+            delta = value - self.mean
+            self.mean += self.alpha * delta
+            self.variance = (1 - self.alpha) * (self.variance + self.alpha * delta * delta)
+        return event
+
+    def reset(self):
+        super().reset()
+        self.mean = None
+        self.variance = 0.0
+        self.cusum = 0.0
+
+    def describe(self):
+        return f"a sustained rise of more than {self.threshold} standard deviations (CUSUM)"
+
+
+DETECTORS = {detector.name: detector for detector in (ThresholdDetector, EwmaDetector, ZScoreDetector, CusumDetector)}
+
+
+# Build a detector from the "spike_detection" section of config.json, e.g. {"algorithm": "ewma", "k": 4}
+def create_detector(settings=None):
+    settings = dict(settings or {})
+    algorithm = settings.pop("algorithm", ThresholdDetector.name)
+    if algorithm not in DETECTORS:
+        # A typo in config.json shouldn't keep the monitor from starting, the other settings may not apply either
+        logger.error(f"Unknown spike detection algorithm '{algorithm}', expected one of {', '.join(DETECTORS)}. Using '{ThresholdDetector.name}'")
+        return ThresholdDetector()
+    return DETECTORS[algorithm](**settings)
@@ -0,0 +1,88 @@
+import argparse
+import fnmatch
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from loguru import logger
+from Report_Data import ReportData
+from Report_Sources import read_source, store_coverage
+from Report_Writers import write_csv, write_html
+
+LOG_DATA_PATTERN = "log_data_*.json"
+APP_LOG_PATTERN = "App_Log*.log"
+
+
+# Every log_data_*.json and App_Log*.log below the given files and directories, as (kind, path)
+def find_sources(paths):
+    sources = []
+    for path in paths:
+        if os.path.isfile(path):
+            candidates = [path]
+        else:
+            candidates = [os.path.join(root, name) for root, _, names in os.walk(path) for name in sorted(names)]
+        for candidate in candidates:
+            name = os.path.basename(candidate)
+            if fnmatch.fnmatch(name, LOG_DATA_PATTERN):
+                sources.append(("log_data", candidate))
+            elif fnmatch.fnmatch(name, APP_LOG_PATTERN):
+                sources.append(("app_log", candidate))
+    return sources
+
+
+def build_report(sources, store=None, jobs=1, event_gap=60.0):
+    """Read every source into one ReportData, `jobs` files at a time in worker processes when above 1."""
+    report = ReportData()
+    latency_until = {}
+    if store is not None:
+        # Log lines of times the store already covers would count the same runs twice
+        latency_until = store_coverage(store)
+        sources = [("store", store)] + sources
+
+    if jobs <= 1:
+        for kind, path in sources:
+            report.merge(read_source(kind, path, latency_until, event_gap))
+        return report
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(read_source, kind, path, latency_until, event_gap) for kind, path in sources]
+        for future in as_completed(futures):
+            report.merge(future.result())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hour-of-day heatmaps, daily percentile trends and degradation events from the ping history.")
+    parser.add_argument("paths", nargs="*", default=["."], help="Files or directories with log_data_*.json and App_Log*.log files (default: current directory)")
+    parser.add_argument("--store", default="ping_data.db", help="Sample store of Ping_App, skipped when the file doesn't exist")
+    parser.add_argument("--output", default="ping_report", help="Output directory")
+    parser.add_argument("--format", choices=("csv", "html", "both"), default="both", help="Output format")
+    parser.add_argument("--jobs", type=int, default=1, help="Files read in parallel, 0 for one per CPU core")
+    parser.add_argument("--degradation", type=float, default=0.25, help="Daily p95 increase over the baseline that counts as degraded (0.25 = 25%%)")
+    parser.add_argument("--baseline-days", type=int, default=7, help="Days before a day whose median p95 is its baseline")
+    parser.add_argument("--event-gap", type=float, default=60.0, help="Failures and spikes of a server at most this many seconds apart form one event")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    sources = find_sources(args.paths)
+    store = args.store if os.path.exists(args.store) else None
+    if not sources and store is None:
+        logger.error(f"No log_data_*.json, App_Log*.log or {args.store} found in {', '.join(args.paths)}")
+        return
+    logger.info(f"Reading {len(sources)} files" + (f" and {store}" if store else ""))
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    report = build_report(sources, store, jobs, args.event_gap)
+    report.detect_degradation(args.degradation, args.baseline_days)
+
+    os.makedirs(args.output, exist_ok=True)
+    written = []
+    if args.format in ("csv", "both"):
+        written.extend(write_csv(report, args.output))
+    if args.format in ("html", "both"):
+        written.append(write_html(report, os.path.join(args.output, "report.html")))
+    logger.info(f"Processed {report.lines} log lines and {report.samples} samples in {time.monotonic() - started:.1f}s, "
+                f"{len(report.events)} events, wrote {', '.join(written)}")
+
+
+if __name__ == "__main__":
+    main()
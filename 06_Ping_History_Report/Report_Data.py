@@ -0,0 +1,151 @@
+import os
+import statistics
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from Stats import StreamingStats  # noqa: E402
+
+HOUR = 3600
+
+
+# Local (date, hour of day) of an epoch hour, cached since millions of samples share a few thousand hours
+@lru_cache(maxsize=8192)
+def local_hour(epoch_hour):
+    moment = datetime.fromtimestamp(epoch_hour * HOUR)
+    return moment.strftime("%Y-%m-%d"), moment.hour
+
+
+class ReportEvent:
+    """Something worth a look in the history: an outage, a burst of failures or spikes, or a degraded day."""
+
+    __slots__ = ("start", "end", "interface", "server", "kind", "count", "detail")
+
+    def __init__(self, start, end, interface, server, kind, count=1, detail=""):
+        self.start = start  # Epoch seconds
+        self.end = end
+        self.interface = interface
+        self.server = server
+        self.kind = kind  # "outage", "failures", "spikes" or "degradation"
+        self.count = count
+        self.detail = detail
+
+
+class ReportData:
+    """Everything the report shows, aggregated in a single pass.
+
+    Memory depends on the number of servers, interfaces and days covered, never on the number of samples:
+    every latency lands in an hour-of-day cell and a day cell, each a fixed-size StreamingStats.
+    """
+
+    def __init__(self):
+        self.heatmap = {}  # (interface, server, hour of day) -> [failures, StreamingStats]
+        self.trends = {}  # (interface, server, "YYYY-MM-DD") -> [failures, StreamingStats]
+        self.days = {}  # (interface, server) -> {"YYYY-MM-DD": the same cell as in trends}, for servers() and trend()
+        self.history = {}  # (interface, server) -> (source, StreamingStats) of the recorded per-run averages
+        self.events = []
+        self.files = 0
+        self.lines = 0
+        self.samples = 0
+
+    def _cells(self, interface, server, day, hour):
+        heat_key = (interface, server, hour)
+        if heat_key not in self.heatmap:
+            self.heatmap[heat_key] = [0, StreamingStats()]
+        trend_key = (interface, server, day)
+        if trend_key not in self.trends:
+            self._add_trend(trend_key, [0, StreamingStats()])
+        return self.heatmap[heat_key], self.trends[trend_key]
+
+    def _add_trend(self, key, cell):
+        self.trends[key] = cell
+        self.days.setdefault(key[:2], {})[key[2]] = cell
+
+    def add_latency(self, interface, server, day, hour, latency):
+        """One sample, None for a failed attempt. day is "YYYY-MM-DD" and hour 0-23, both local time."""
+        self.samples += 1
+        for cell in self._cells(interface, server, day, hour):
+            if latency is None:
+                cell[0] += 1
+            else:
+                cell[1].add(latency)
+
+    def add_sample(self, timestamp, interface, server, latency):
+        day, hour = local_hour(int(timestamp // HOUR))
+        self.add_latency(interface, server, day, hour, latency)
+
+    def add_rollup(self, bucket_start, interface, server, failures, stats):
+        """An hourly rollup of the sample store, merged as a whole."""
+        day, hour = local_hour(int(bucket_start // HOUR))
+        self.samples += failures + stats.count
+        for cell in self._cells(interface, server, day, hour):
+            cell[0] += failures
+            cell[1].merge(stats)
+
+    def add_history(self, interface, server, source, stats):
+        # The sample store took over from the log_data files, so it wins when both know the server
+        current = self.history.get((interface, server))
+        if current is None or (current[0] != "store" and source == "store"):
+            self.history[(interface, server)] = (source, stats)
+
+    def add_event(self, event):
+        self.events.append(event)
+
+    def merge(self, other):
+        for target, source in ((self.heatmap, other.heatmap), (self.trends, other.trends)):
+            for key, (failures, stats) in source.items():
+                if key in target:
+                    target[key][0] += failures
+                    target[key][1].merge(stats)
+                elif target is self.trends:
+                    self._add_trend(key, [failures, stats])
+                else:
+                    target[key] = [failures, stats]
+        for (interface, server), (source, stats) in other.history.items():
+            self.add_history(interface, server, source, stats)
+        self.events.extend(other.events)
+        self.files += other.files
+        self.lines += other.lines
+        self.samples += other.samples
+        return self
+
+    def interfaces(self):
+        return sorted({key[0] for key in self.days} | {key[0] for key in self.history})
+
+    def servers(self, interface):
+        # Every heatmap cell has a trend cell of the same server, so the index covers both
+        return sorted({key[1] for key in self.days if key[0] == interface} | {key[1] for key in self.history if key[0] == interface})
+
+    def trend(self, interface, server):
+        """[(day, failures, StreamingStats)] of a server, oldest first."""
+        return sorted((day, failures, stats) for day, (failures, stats) in self.days.get((interface, server), {}).items())
+
+    def detect_degradation(self, threshold=0.25, baseline_days=7, min_count=10):
+        """Add an event for every run of days whose p95 is more than `threshold` above the median p95 of the
+        `baseline_days` days before it. Days with fewer than `min_count` latencies don't count either way."""
+        for interface in self.interfaces():
+            for server in self.servers(interface):
+                baseline = deque(maxlen=baseline_days)
+                open_event = None
+                for day, _, stats in self.trend(interface, server):
+                    if stats.count < min_count:
+                        continue
+                    p95 = stats.percentile(95)
+                    reference = statistics.median(baseline) if len(baseline) == baseline_days else None
+                    if reference and p95 > reference * (1 + threshold):
+                        start = time.mktime(datetime.strptime(day, "%Y-%m-%d").timetuple())
+                        end = time.mktime((datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).timetuple())
+                        detail = f"p95 {p95:.1f} ms vs {reference:.1f} ms baseline (+{100 * (p95 / reference - 1):.0f}%)"
+                        if open_event is not None and open_event.end == start:
+                            open_event.end = end
+                            open_event.count += 1
+                            open_event.detail = detail
+                        else:
+                            open_event = ReportEvent(start, end, interface, server, "degradation", 1, detail)
+                            self.add_event(open_event)
+                        continue  # A degraded day doesn't become part of the baseline
+                    open_event = None
+                    baseline.append(p95)
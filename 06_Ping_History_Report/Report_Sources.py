@@ -0,0 +1,214 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from loguru import logger
+from Report_Data import ReportData, ReportEvent
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from Stats import StreamingStats  # noqa: E402
+
+# Default loguru format: "2024-10-18 09:00:16.717 | ERROR    | __main__:on_probe_result:241 - Failed to ping server: CH 01"
+LOG_LINE = re.compile(r"^(\d{4}-\d\d-\d\d) (\d\d):(\d\d):(\d\d)(?:\.\d+)? \| (\w+)\s*\| \S+ - (.*)$")
+
+# Messages naming the interface the following lines were measured on, by Ping_App and the live monitor
+INTERFACE_MESSAGES = (
+    re.compile(r"^Using network interface: (.+)$"),
+    re.compile(r"^Current Network Interface: (?:VPN Detected: )?(.+)$"),
+    re.compile(r"^VPN Detected: (.+)$"),
+    re.compile(r"^No VPN detected, using (.+)$"),
+    re.compile(r"^Network interface changed from .* to (.+)$"),
+)
+AVERAGE_MESSAGE = re.compile(r"^Server: (.+?), Avg Ping: (N/A|[\d.]+)")
+FAILURE_MESSAGE = re.compile(r"^Failed to ping server: (.+?)(?:\. Error: .*)?$")
+SPIKE_MESSAGE = re.compile(r"^(.+?) - Spike Detected - ([\d.]+)ms")
+UNREACHABLE_MESSAGE = re.compile(r"^(.+?) unreachable after (\d+) failed pings")
+RECOVERED_MESSAGE = re.compile(r"^(.+?) reachable again after (\d+) failed pings")
+# Periodic summary of the live monitor's log rate limit, the count includes the lines logged individually
+SUMMARY_MESSAGE = re.compile(r"^(.+?): (\d+) (failures|spikes) in last \d+s$")
+
+UNKNOWN_INTERFACE = "unknown"
+
+
+def local_epoch(day, hour, minute, second):
+    return time.mktime(datetime.strptime(f"{day} {hour}:{minute}:{second}", "%Y-%m-%d %H:%M:%S").timetuple())
+
+
+class EventCoalescer:
+    """Folds repeated failure and spike lines of a server into one event while they are at most `gap` seconds apart."""
+
+    def __init__(self, report, gap=60.0):
+        self.report = report
+        self.gap = gap
+        self.open = {}  # (interface, server, kind) -> (ReportEvent, worst value)
+        self.logged = {}  # (interface, server, kind) -> individual lines since the last rate limit summary
+
+    def add(self, timestamp, interface, server, kind, value=None):
+        key = (interface, server, kind)
+        current = self.open.get(key)
+        if current is not None and timestamp - current[0].end <= self.gap:
+            event, worst = current
+            event.end = timestamp
+            event.count += 1
+        else:
+            event, worst = ReportEvent(timestamp, timestamp, interface, server, kind), None
+            self.report.add_event(event)
+        if value is not None:
+            worst = value if worst is None else max(worst, value)
+            event.detail = f"worst {worst:.1f} ms"
+        self.open[key] = (event, worst)
+        self.logged[key] = self.logged.get(key, 0) + 1
+
+    def add_summary(self, timestamp, interface, server, kind, total):
+        """A "CH 12: 37 failures in last 60s" line, adds the messages that weren't logged individually."""
+        key = (interface, server, kind)
+        held_back = total - self.logged.pop(key, 0)
+        if held_back <= 0:
+            return
+        self.add(timestamp, interface, server, kind)
+        self.logged.pop(key, None)
+        self.open[key][0].count += held_back - 1
+
+
+# Stream one App_Log*.log file. Average pings of Ping_App runs become samples unless the sample store already
+# covers that interface and time (latency_until: {interface: "YYYY-MM-DD HH:MM:SS"} of its first sample).
+def read_app_log(path, report, latency_until=None, gap=60.0):
+    latency_until = latency_until or {}
+    coalescer = EventCoalescer(report, gap)
+    outages = {}  # (interface, server) -> open outage event
+    interface = UNKNOWN_INTERFACE
+    last_timestamp = None
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            report.lines += 1
+            match = LOG_LINE.match(line)
+            if not match:
+                continue  # Tracebacks and other continuation lines
+            day, hour, minute, second, _, message = match.groups()
+
+            average = AVERAGE_MESSAGE.match(message)
+            if average:
+                cutoff = latency_until.get(interface)
+                if cutoff is None or f"{day} {hour}:{minute}:{second}" < cutoff:
+                    value = average[2]
+                    report.add_latency(interface, average[1], day, int(hour), None if value == "N/A" else float(value))
+                continue
+
+            for pattern in INTERFACE_MESSAGES:
+                changed = pattern.match(message)
+                if changed:
+                    interface = changed[1].strip()
+                    break
+            if changed:
+                continue
+
+            failure = FAILURE_MESSAGE.match(message)
+            spike = SPIKE_MESSAGE.match(message) if not failure else None
+            unreachable = UNREACHABLE_MESSAGE.match(message) if not (failure or spike) else None
+            recovered = RECOVERED_MESSAGE.match(message) if not (failure or spike or unreachable) else None
+            summary = SUMMARY_MESSAGE.match(message) if not (failure or spike or unreachable or recovered) else None
+            if not (failure or spike or unreachable or recovered or summary):
+                continue
+
+            last_timestamp = local_epoch(day, hour, minute, second)
+            if failure:
+                coalescer.add(last_timestamp, interface, failure[1], "failures")
+            elif spike:
+                coalescer.add(last_timestamp, interface, spike[1], "spikes", float(spike[2]))
+            elif summary:
+                coalescer.add_summary(last_timestamp, interface, summary[1], summary[3], int(summary[2]))
+            elif unreachable:
+                event = ReportEvent(last_timestamp, last_timestamp, interface, unreachable[1], "outage", int(unreachable[2]))
+                outages[(interface, unreachable[1])] = event
+                report.add_event(event)
+            else:
+                event = outages.pop((interface, recovered[1]), None)
+                if event is not None:
+                    event.end = last_timestamp
+                    event.count = int(recovered[2])
+                    event.detail = f"recovered after {event.count} failed pings"
+
+    for event in outages.values():
+        event.end = last_timestamp
+        event.detail = "still unreachable at the end of the log"
+    report.files += 1
+
+
+# Per-run averages of a log_data_<interface>.json file, either the running statistics or the older list of every run
+def read_log_data(path, report):
+    interface = os.path.basename(path)[len("log_data_"):-len(".json")]
+    with open(path) as f:
+        log_data = json.load(f)  # One object per interface, small next to the logs
+    for server_name, entry in log_data.items():
+        if f"{server_name}_stats" in entry:
+            stats = StreamingStats.from_dict(entry[f"{server_name}_stats"])
+        else:
+            stats = StreamingStats.from_samples(entry.get(f"{server_name}_previous_pings", []))
+        if stats.count:
+            report.add_history(interface, server_name, "log_data", stats)
+    report.files += 1
+
+
+def connect_read_only(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+# First covered time per interface of the sample store, as a local "YYYY-MM-DD HH:MM:SS" for comparing log lines
+def store_coverage(path):
+    conn = connect_read_only(path)
+    try:
+        first = {}
+        for interface, ts in conn.execute(
+            "SELECT interface, MIN(ts) FROM (SELECT interface, ts FROM samples "
+            "UNION ALL SELECT interface, bucket_start FROM rollups WHERE period = 'hour') GROUP BY interface"
+        ):
+            first[interface] = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        return first
+    finally:
+        conn.close()
+
+
+# Stream the sample store: hourly rollups for the compacted hours, raw samples after them, the running statistics as history
+def read_sample_store(path, report):
+    conn = connect_read_only(path)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'hourly_compacted_until'").fetchone()
+        compacted_until = int(row[0]) if row else 0
+
+        for bucket_start, interface, server, failures, stats in conn.execute(
+            "SELECT bucket_start, interface, server, failures, stats FROM rollups WHERE period = 'hour' AND bucket_start < ?", (compacted_until,)
+        ):
+            report.add_rollup(bucket_start, interface, server, failures, StreamingStats.from_dict(json.loads(stats)))
+
+        # Raw samples of compacted hours are kept for a while, they are already part of the rollups
+        for ts, interface, server, latency in conn.execute(
+            "SELECT ts, interface, server, latency_ms FROM samples WHERE ts >= ?", (compacted_until,)
+        ):
+            report.add_sample(ts, interface, server, latency)
+
+        for interface, server, entry in conn.execute("SELECT interface, server, entry FROM server_stats"):
+            stats = json.loads(entry).get(f"{server}_stats")
+            if stats:
+                report.add_history(interface, server, "store", StreamingStats.from_dict(stats))
+    finally:
+        conn.close()
+    report.files += 1
+
+
+# Entry point of a worker process: read one source into a fresh ReportData
+def read_source(kind, path, latency_until=None, gap=60.0):
+    report = ReportData()
+    try:
+        if kind == "store":
+            read_sample_store(path, report)
+        elif kind == "log_data":
+            read_log_data(path, report)
+        else:
+            read_app_log(path, report, latency_until, gap)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.error(f"Skipping {path}: {e}")
+    return report
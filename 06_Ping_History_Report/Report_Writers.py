@@ -0,0 +1,181 @@
+import csv
+import html
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from Server_Catalog import AUCTION_HOUSE, CASH_SHOP, CHANNEL, LOGIN, classify  # noqa: E402
+from Stats import StreamingStats  # noqa: E402
+
+KIND_ORDER = {CHANNEL: 0, AUCTION_HOUSE: 1, CASH_SHOP: 2, LOGIN: 3}
+
+
+# Channels by number, then AH, CS, logins and everything else by name, like Ping_App's sort_servers
+def server_sort_key(server):
+    kind, channel, world = classify(server)
+    return world or "", KIND_ORDER.get(kind, 4), channel or 0, server
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp is not None else ""
+
+
+def round_or_blank(value, digits=2):
+    return round(value, digits) if value is not None else ""
+
+
+def loss_percent(failures, stats):
+    total = failures + stats.count
+    return 100 * failures / total if total else None
+
+
+def summarize(report, interface, server):
+    """[failures, StreamingStats] of every timed sample of a server, merged over the hours of the day."""
+    failures, stats = 0, StreamingStats()
+    for hour in range(24):
+        cell = report.heatmap.get((interface, server, hour))
+        if cell is not None:
+            failures += cell[0]
+            stats.merge(cell[1])
+    return failures, stats
+
+
+def sorted_events(report):
+    return sorted(report.events, key=lambda event: (event.start, event.interface, event.server))
+
+
+def write_csv(report, directory):
+    """summary.csv, heatmap.csv, trends.csv and events.csv in `directory`, returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, f"{name}.csv") for name in ("summary", "heatmap", "trends", "events")}
+
+    with open(paths["summary"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["interface", "server", "samples", "failures", "loss_percent", "min_ms", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+                         "history_source", "history_runs", "history_mean_ms", "history_min_ms", "history_p95_ms"])
+        for interface in report.interfaces():
+            for server in sorted(report.servers(interface), key=server_sort_key):
+                failures, stats = summarize(report, interface, server)
+                source, history = report.history.get((interface, server), ("", StreamingStats()))
+                writer.writerow([
+                    interface, server, stats.count, failures, round_or_blank(loss_percent(failures, stats)),
+                    round_or_blank(stats.min if stats.count else None), round_or_blank(stats.mean if stats.count else None),
+                    round_or_blank(stats.percentile(50)), round_or_blank(stats.percentile(95)), round_or_blank(stats.percentile(99)),
+                    round_or_blank(stats.max if stats.count else None),
+                    source, history.count, round_or_blank(history.mean if history.count else None),
+                    round_or_blank(history.min if history.count else None), round_or_blank(history.percentile(95)),
+                ])
+
+    with open(paths["heatmap"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["interface", "server", "hour", "samples", "failures", "loss_percent", "mean_ms", "p50_ms", "p95_ms"])
+        for (interface, server, hour), (failures, stats) in sorted(report.heatmap.items(), key=lambda item: (item[0][0], server_sort_key(item[0][1]), item[0][2])):
+            writer.writerow([interface, server, hour, stats.count, failures, round_or_blank(loss_percent(failures, stats)),
+                             round_or_blank(stats.mean if stats.count else None), round_or_blank(stats.percentile(50)), round_or_blank(stats.percentile(95))])
+
+    with open(paths["trends"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["interface", "server", "date", "samples", "failures", "loss_percent", "p50_ms", "p95_ms", "p99_ms"])
+        for (interface, server, day), (failures, stats) in sorted(report.trends.items(), key=lambda item: (item[0][0], server_sort_key(item[0][1]), item[0][2])):
+            writer.writerow([interface, server, day, stats.count, failures, round_or_blank(loss_percent(failures, stats)),
+                             round_or_blank(stats.percentile(50)), round_or_blank(stats.percentile(95)), round_or_blank(stats.percentile(99))])
+
+    with open(paths["events"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["start", "end", "interface", "server", "kind", "count", "detail"])
+        for event in sorted_events(report):
+            writer.writerow([format_time(event.start), format_time(event.end), event.interface, event.server, event.kind, event.count, event.detail])
+
+    return list(paths.values())
+
+
+# Green for the fastest hour of a row, red for the slowest
+def heat_color(value, low, high):
+    share = (value - low) / (high - low) if high > low else 0.0
+    return f"hsl({120 * (1 - share):.0f}, 70%, 80%)"
+
+
+def trend_svg(points, width=360, height=60):
+    """Inline SVG of the daily p50 (blue) and p95 (orange), points are (p50, p95) per day."""
+    values = [value for point in points for value in point if value is not None]
+    if len(points) < 2 or not values:
+        return ""
+    low, high = min(values), max(values)
+    span = (high - low) or 1.0
+
+    def polyline(index, color):
+        coordinates = " ".join(f"{width * position / (len(points) - 1):.1f},{height - 4 - (height - 8) * (point[index] - low) / span:.1f}"
+                               for position, point in enumerate(points) if point[index] is not None)
+        return f'<polyline fill="none" stroke="{color}" stroke-width="1.5" points="{coordinates}"/>'
+
+    return (f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+            f'{polyline(0, "#1f77b4")}{polyline(1, "#ff7f0e")}</svg>')
+
+
+def write_html(report, path, title="Ping History Report"):
+    """One static page with the summary, hour-of-day heatmaps, daily trends and events, no scripts or external files."""
+    escape = html.escape
+    parts = [
+        "<!DOCTYPE html>", "<html><head><meta charset=\"utf-8\">", f"<title>{escape(title)}</title>",
+        "<style>body{font-family:sans-serif;margin:20px}table{border-collapse:collapse;margin-bottom:24px}"
+        "td,th{border:1px solid #ccc;padding:2px 6px;text-align:right;font-size:12px}td:first-child,th:first-child{text-align:left}"
+        ".legend span{padding:0 6px}</style></head><body>",
+        f"<h1>{escape(title)}</h1>",
+        f"<p>{report.files} files, {report.lines} log lines, {report.samples} samples, generated {format_time(datetime.now().timestamp())}.</p>",
+    ]
+
+    for interface in report.interfaces():
+        servers = sorted(report.servers(interface), key=server_sort_key)
+        parts.append(f"<h2>{escape(interface)}</h2>")
+
+        parts.append("<h3>Summary</h3><table><tr><th>Server</th><th>Samples</th><th>Loss</th><th>Mean</th><th>p50</th><th>p95</th><th>p99</th>"
+                     "<th>Recorded runs</th><th>Recorded mean</th><th>Recorded min</th></tr>")
+        for server in servers:
+            failures, stats = summarize(report, interface, server)
+            _, history = report.history.get((interface, server), ("", StreamingStats()))
+            loss = loss_percent(failures, stats)
+            cells = [stats.count, f"{loss:.1f}%" if loss is not None else "",
+                     f"{stats.mean:.1f}" if stats.count else "", *(f"{stats.percentile(q):.1f}" if stats.count else "" for q in (50, 95, 99)),
+                     history.count or "", f"{history.mean:.1f}" if history.count else "", f"{history.min:.1f}" if history.count else ""]
+            parts.append(f"<tr><td>{escape(server)}</td>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+        parts.append("</table>")
+
+        parts.append("<h3>Median ping by hour of day (ms)</h3><table><tr><th>Server</th>" + "".join(f"<th>{hour:02}</th>" for hour in range(24)) + "</tr>")
+        for server in servers:
+            row = {hour: report.heatmap.get((interface, server, hour)) for hour in range(24)}
+            medians = {hour: cell[1].percentile(50) for hour, cell in row.items() if cell is not None and cell[1].count}
+            if not medians:
+                continue
+            low, high = min(medians.values()), max(medians.values())
+            cells = []
+            for hour in range(24):
+                if hour not in medians:
+                    cells.append("<td></td>")
+                    continue
+                failures, stats = row[hour]
+                tooltip = f"{stats.count} samples, p95 {stats.percentile(95):.1f} ms, loss {loss_percent(failures, stats):.1f}%"
+                cells.append(f'<td style="background:{heat_color(medians[hour], low, high)}" title="{tooltip}">{medians[hour]:.0f}</td>')
+            parts.append(f"<tr><td>{escape(server)}</td>{''.join(cells)}</tr>")
+        parts.append("</table>")
+
+        parts.append("<h3>Daily percentiles</h3><p class=\"legend\"><span style=\"color:#1f77b4\">p50</span><span style=\"color:#ff7f0e\">p95</span></p>"
+                     "<table><tr><th>Server</th><th>Days</th><th>First</th><th>Last</th><th>Trend</th><th>Last p50</th><th>Last p95</th></tr>")
+        for server in servers:
+            days = [(day, stats) for day, _, stats in report.trend(interface, server) if stats.count]
+            if not days:
+                continue
+            points = [(stats.percentile(50), stats.percentile(95)) for _, stats in days]
+            parts.append(f"<tr><td>{escape(server)}</td><td>{len(days)}</td><td>{days[0][0]}</td><td>{days[-1][0]}</td>"
+                         f"<td>{trend_svg(points)}</td><td>{points[-1][0]:.1f}</td><td>{points[-1][1]:.1f}</td></tr>")
+        parts.append("</table>")
+
+    parts.append("<h2>Events</h2><table><tr><th>Start</th><th>End</th><th>Interface</th><th>Server</th><th>Kind</th><th>Count</th><th>Detail</th></tr>")
+    for event in sorted_events(report):
+        parts.append(f"<tr><td>{format_time(event.start)}</td><td>{format_time(event.end)}</td><td>{escape(event.interface)}</td>"
+                     f"<td>{escape(event.server)}</td><td>{event.kind}</td><td>{event.count}</td><td>{escape(event.detail)}</td></tr>")
+    parts.append("</table></body></html>")
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+    return path
@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from loguru import logger
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "Common"))
+sys.path.append(os.path.join(ROOT, "04_Check_Game_Ping"))
+sys.path.append(os.path.join(ROOT, "05_Check_Game_Live_Ping"))
+import Ping_App  # noqa: E402
+from Ping_Engine import PingEngine  # noqa: E402
+from Prober import SamplingPolicy, run_probe_summaries  # noqa: E402
+from Server_Catalog import ServerCatalog  # noqa: E402
+
+
+# Farm process: listen on every address, report the ports and accept until terminated
+def serve(addresses, connection):
+    async def handle(reader, writer):
+        writer.close()
+
+    async def listen():
+        ports = {}
+        for ip in addresses:
+            server = await asyncio.start_server(handle, ip, 0, backlog=1024)
+            ports[ip] = server.sockets[0].getsockname()[1]
+        connection.send(ports)
+        await asyncio.Event().wait()
+
+    asyncio.run(listen())
+
+
+class ServerFarm:
+    """N TCP listeners on their own loopback addresses (127.1.x.y), served by a separate process.
+
+    Accepting runs in another process so it doesn't compete with the probers for the GIL and skew their timings.
+
+    The kernel completes the handshake before accept(), so a delay on the server side can't be seen by a connect.
+    The injected delay, jitter and drops are applied to the client's connect instead (see inject_latency), and every
+    injected delay is recorded as the ground truth of that connection.
+    """
+
+    def __init__(self, count, delay=20.0, jitter=0.0, drop=0.0, seed=None):
+        self.count = count
+        self.delay = delay  # ms
+        self.jitter = jitter  # ms, standard deviation of a normal distribution around delay
+        self.drop = drop  # Probability that a connection never completes
+        self.random = random.Random(seed)
+        self.addresses = [f"127.1.{index // 250}.{index % 250 + 1}" for index in range(count)]
+        self.ports = {}
+        self.injected = {ip: [] for ip in self.addresses}  # ip -> injected delay (ms) of every completed connection
+        self.dropped = {ip: 0 for ip in self.addresses}
+        self.connect_times = {ip: [] for ip in self.addresses}  # perf_counter() of every connect the prober started
+        self._process = None
+
+    def start(self):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(target=serve, args=(self.addresses, sender), name="ServerFarm", daemon=True)
+        self._process.start()
+        self.ports = receiver.recv()
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+    def catalog(self):
+        return ServerCatalog.from_names({ip: {"name": f"CH {index + 1:02}", "port": self.ports[ip]} for index, ip in enumerate(self.addresses)})
+
+    def sample_delay(self, ip):
+        """Injected delay in ms for a new connection to ip, None when it is dropped."""
+        if self.random.random() < self.drop:
+            self.dropped[ip] += 1
+            return None
+        return max(self.random.gauss(self.delay, self.jitter), 0.0) if self.jitter else self.delay
+
+    def reset(self):
+        for ip in self.addresses:
+            self.injected[ip].clear()
+            self.dropped[ip] = 0
+            self.connect_times[ip].clear()
+
+
+@contextmanager
+def inject_latency(farm):
+    """Wrap asyncio.open_connection so connects to the farm complete after their injected delay, or never."""
+    original = asyncio.open_connection
+
+    async def open_connection(host=None, port=None, **kwargs):
+        if host not in farm.injected:
+            return await original(host, port, **kwargs)
+        farm.connect_times[host].append(time.perf_counter())
+        delay = farm.sample_delay(host)
+        if delay is None:
+            await asyncio.sleep(3600)  # A dropped SYN, the prober's timeout cancels this
+        connection = await original(host, port, **kwargs)
+        await asyncio.sleep(delay / 1000)
+        farm.injected[host].append(delay)
+        return connection
+
+    asyncio.open_connection = open_connection
+    try:
+        yield
+    finally:
+        asyncio.open_connection = original
+
+
+def measure_baseline(farm, attempts=200):
+    """Median loopback connect time in ms without injection, added to the injected delay as ground truth."""
+    ip = farm.addresses[0]
+    summaries = run_probe_summaries([(ip, farm.ports[ip])], timeout=1, concurrency=1, policy=fixed_policy(attempts))
+    return statistics.median(summaries[0].latencies)
+
+
+def fixed_policy(attempts):
+    return SamplingPolicy(min_attempts=attempts, max_attempts=attempts, target_ci=0, min_ci_ms=0,
+                          max_failed_batches=attempts, pacing=0, parallel=1)
+
+
+def bias_report(measured, farm, baseline):
+    """Mean measured - (mean injected + baseline) per server, in ms."""
+    biases = []
+    for ip, latencies in measured.items():
+        if latencies and farm.injected[ip]:
+            biases.append(statistics.fmean(latencies) - statistics.fmean(farm.injected[ip]) - baseline)
+    if not biases:
+        return "no successful probes"
+    return f"mean {statistics.fmean(biases):+.3f} ms, worst {max(biases, key=abs):+.3f} ms over {len(biases)} servers"
+
+
+def bench_ping_app(farm, baseline, concurrency, attempts, adaptive):
+    farm.reset()
+    policy = SamplingPolicy() if adaptive else fixed_policy(attempts)
+    started = time.perf_counter()
+    results = Ping_App.ping_all_servers(farm.catalog(), concurrency=concurrency, policy=policy)
+    elapsed = time.perf_counter() - started
+
+    probes = sum(len(summary.samples) for _, _, summary in results)
+    failed = sum(len(summary.samples) - len(summary.latencies) for _, _, summary in results)
+    measured = {summary.ip: summary.latencies for _, _, summary in results}
+    print(f"Ping_App.ping_all_servers ({'adaptive' if adaptive else f'{attempts} attempts'}, concurrency {concurrency})")
+    print(f"  {probes} probes in {elapsed:.2f}s, {probes / elapsed:.0f} probes/s")
+    print(f"  measured loss {100 * failed / max(probes, 1):.1f}%, injected {100 * farm.drop:.1f}%")
+    print(f"  bias {bias_report(measured, farm, baseline)}")
+
+
+def bench_live_engine(farm, baseline, concurrency, interval, duration):
+    farm.reset()
+    config = {"probe_interval": interval, "probe_timeout": 1, "probe_concurrency": concurrency,
+              "spike_detection": {"algorithm": "ewma"}, "circuit_breaker": {"failure_threshold": 1000}}
+    engine = PingEngine(farm.catalog(), config)
+    measured = {ip: [] for ip in farm.addresses}
+
+    def on_record(record):
+        if record["ping"] is not None:
+            measured[record["ip"]].append(record["ping"])
+
+    engine.subscribe(on_record)
+    engine.start()
+    time.sleep(duration)
+    engine.stop()
+    engine.join()
+
+    # Deviation of the time between two connects of a server from a whole number of intervals,
+    # ticks skipped while a dropped probe waits for its timeout are counted as missed ticks instead
+    errors = []
+    for times in farm.connect_times.values():
+        for earlier, later in zip(times, times[1:]):
+            gap = later - earlier
+            errors.append(abs(gap - max(round(gap / interval), 1) * interval) * 1000)
+    probes = sum(len(times) for times in farm.connect_times.values())
+    expected = len(farm.addresses) * duration / interval
+    print(f"PingEngine ({len(farm.addresses)} servers every {interval}s for {duration}s, concurrency {concurrency})")
+    print(f"  {probes} probes, {probes / duration:.0f} probes/s ({100 * probes / expected:.0f}% of schedule), "
+          f"{sum(engine.scheduler.missed_ticks.values())} missed ticks")
+    if errors:
+        errors.sort()
+        print(f"  scheduling error p50 {errors[len(errors) // 2]:.2f} ms, p99 {errors[int(len(errors) * 0.99)]:.2f} ms, max {errors[-1]:.2f} ms")
+    print(f"  bias {bias_report(measured, farm, baseline)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure prober throughput, scheduling error and bias against local listeners with injected latency.")
+    parser.add_argument("--servers", type=int, default=200, help="Number of listeners")
+    parser.add_argument("--delay", type=float, default=20.0, help="Injected connect delay in ms")
+    parser.add_argument("--jitter", type=float, default=2.0, help="Standard deviation of the injected delay in ms")
+    parser.add_argument("--drop", type=float, default=0.0, help="Share of connections that never complete (0-1)")
+    parser.add_argument("--concurrency", type=int, default=256, help="Probe concurrency of both probers")
+    parser.add_argument("--attempts", type=int, default=10, help="Attempts per server for the fixed Ping_App sweep")
+    parser.add_argument("--interval", type=float, default=1.0, help="Live engine probe interval in seconds")
+    parser.add_argument("--duration", type=float, default=10.0, help="Live engine run time in seconds")
+    parser.add_argument("--seed", type=int, help="Seed of the injected delays and drops")
+    args = parser.parse_args()
+
+    logger.remove()  # Failed probes of the drop tests would flood the report
+
+    farm = ServerFarm(args.servers, args.delay, args.jitter, args.drop, args.seed)
+    farm.start()
+    try:
+        baseline = measure_baseline(farm)
+        print(f"{args.servers} listeners, injected delay {args.delay} ms, jitter {args.jitter} ms, drop {100 * args.drop:.1f}%, "
+              f"loopback baseline {baseline:.3f} ms")
+        with inject_latency(farm):
+            bench_ping_app(farm, baseline, args.concurrency, args.attempts, adaptive=False)
+            bench_ping_app(farm, baseline, args.concurrency, args.attempts, adaptive=True)
+            bench_live_engine(farm, baseline, args.concurrency, args.interval, args.duration)
+    finally:
+        farm.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import atexit
+import threading
+from loguru import logger
+
+
+# File sink of the tools: formatting stays on the calling thread, the file I/O moves to loguru's writer thread
+def setup_logging(path="App_Log_{time}.log"):
+    return logger.add(path, rotation="30 days", backtrace=True, enqueue=True, catch=True)
+
+
+class LogLimiter:
+    """Caps how often the same kind of message is logged per key (e.g. per server).
+
+    The first `burst` messages of a key and kind within `window` seconds are logged as usual, the rest are only
+    counted. A background thread then logs one summary per key, e.g. "CH 12: 37 failures in last 60s".
+    Past the cap the calling thread only increments a counter under a short lock.
+    """
+
+    def __init__(self, window=60.0, burst=3):
+        self.window = window
+        self.burst = burst
+        self.counts = {}  # (key, kind) -> messages in the current window, swapped out by the summary thread
+        self.levels = {}  # (key, kind) -> level of the summary, set by the first message of the window
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # Guards counts and levels between the calling threads and the summaries
+        self._start_lock = threading.Lock()
+        atexit.register(self.flush)  # Summaries of the last window aren't lost when the app exits
+
+    def log(self, key, kind, level, message):
+        """Log `message` unless `key` already logged `burst` messages of this kind in the window. Returns whether it was logged."""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            count = self.counts.get((key, kind), 0) + 1
+            self.counts[(key, kind)] = count
+            if count == 1:
+                self.levels[(key, kind)] = level
+        if count > self.burst:
+            return False
+        logger.opt(depth=1).log(level, message)
+        return True
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="LogLimiter", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the summary thread and log what the current window held back."""
+        self._stopped.set()
+        self.flush()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.window):
+            try:
+                self.flush()
+            except Exception as e:
+                # The next window still gets its summaries
+                logger.error(f"Error logging rate limit summaries: {e}")
+
+    def flush(self):
+        # Only the swap is locked, the calling threads start counting the next window right away. Levels go with the
+        # counts, the first message of a key in the next window records its level again, so neither dict keeps growing.
+        with self._lock:
+            counts, self.counts = self.counts, {}
+            levels, self.levels = self.levels, {}
+        for (key, kind), count in counts.items():
+            if count > self.burst:
+                logger.log(levels[(key, kind)], f"{key}: {count} {kind} in last {self.window:.0f}s")
@@ -0,0 +1,154 @@
+import socket
+import struct
+import threading
+import time
+import psutil
+from loguru import logger
+
+ROUTE_FILE = "/proc/net/route"
+RTF_UP = 0x1
+# Any public address, only used to pick the route when no game server address is given
+DEFAULT_DESTINATION = "8.8.8.8"
+
+
+# IPv4 address of a local interface name, or the value itself when it already is an address. None when unknown.
+def interface_address(interface):
+    try:
+        socket.inet_aton(interface)
+        return interface
+    except OSError:
+        pass
+    for address in psutil.net_if_addrs().get(interface, []):
+        if address.family == socket.AF_INET:
+            return address.address
+    return None
+
+
+def is_loopback(interface):
+    name = interface.lower()
+    return name == "lo" or name.startswith("lo0") or name.startswith("loopback")
+
+
+# IPv4 address to look up the route of, for a game server key that may be a hostname or an IPv6 address.
+# Falls back to DEFAULT_DESTINATION, the route of any public address is the best guess left.
+def route_destination(destination):
+    try:
+        socket.inet_aton(destination)
+        return destination
+    except OSError:
+        pass
+    try:
+        return socket.gethostbyname(destination)
+    except OSError as e:
+        logger.warning(f"No IPv4 address for '{destination}' ({e}), detecting the interface of {DEFAULT_DESTINATION} instead")
+        return DEFAULT_DESTINATION
+
+
+# Interface of the most specific up route towards the IPv4 `destination` in /proc/net/route, None when it can't be
+# read. Longest prefix wins, so VPN clients installing 0.0.0.0/1 + 128.0.0.0/1 over the default route are detected.
+def read_route_interface(destination=DEFAULT_DESTINATION, route_file=ROUTE_FILE):
+    try:
+        with open(route_file) as f:
+            lines = f.readlines()[1:]
+        # The kernel prints addresses as host byte order hex, compare in the same order
+        target = struct.unpack("=L", socket.inet_aton(destination))[0]
+    except OSError:
+        return None
+
+    best = None
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        interface, route, flags, metric, mask = fields[0], int(fields[1], 16), int(fields[3], 16), int(fields[6]), int(fields[7], 16)
+        if not flags & RTF_UP or target & mask != route:
+            continue
+        key = (bin(mask).count("1"), -metric)
+        if best is None or key > best[0]:
+            best = (key, interface)
+    return best[1] if best else None
+
+
+class InterfaceResolver:
+    """Interface that traffic to the game servers leaves through, cached for `ttl` seconds.
+
+    Reads the routing table on Linux. Elsewhere it falls back to one psutil.net_if_stats() call and picks an up
+    interface matching a VPN keyword, or else the first up interface that isn't loopback.
+    """
+
+    def __init__(self, vpn_keywords=(), destination=None, ttl=5.0, route_file=ROUTE_FILE):
+        self.vpn_keywords = [keyword.lower() for keyword in vpn_keywords]
+        self.destination = destination or DEFAULT_DESTINATION
+        self._route_destination = None  # IPv4 address of `destination`, resolved on the first lookup
+        self.ttl = ttl
+        self.route_file = route_file
+        self._interface = None
+        self._resolved_at = None
+
+    def is_vpn(self, interface):
+        return interface is not None and any(keyword in interface.lower() for keyword in self.vpn_keywords)
+
+    def resolve(self, refresh=False):
+        """Current interface name, None when no usable interface is up."""
+        now = time.monotonic()
+        if refresh or self._resolved_at is None or now - self._resolved_at >= self.ttl:
+            self._interface = self._lookup()
+            self._resolved_at = now
+        return self._interface
+
+    def _lookup(self):
+        if self._route_destination is None:
+            self._route_destination = route_destination(self.destination)
+        interface = read_route_interface(self._route_destination, self.route_file)
+        if interface is not None:
+            return interface
+
+        try:
+            stats = psutil.net_if_stats()
+        except Exception as e:
+            logger.error(f"Error fetching interface: {e}")
+            return None
+        up = [name for name, stat in stats.items() if stat.isup and not is_loopback(name)]
+        vpn = [name for name in up if self.is_vpn(name)]
+        if vpn:
+            return vpn[0]
+        return up[0] if up else None
+
+
+class InterfaceWatcher:
+    """Background thread re-resolving the interface every `interval` seconds, calls on_change(interface) when it flips."""
+
+    def __init__(self, resolver, on_change, interval=2.0):
+        self.resolver = resolver
+        self.on_change = on_change
+        self.interval = interval
+        self.interface = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.interface = self.resolver.resolve(refresh=True)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="InterfaceWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                interface = self.resolver.resolve(refresh=True)
+            except Exception as e:
+                # Keep watching, the next check may succeed
+                logger.error(f"Error fetching interface: {e}")
+                continue
+            if interface != self.interface:
+                logger.info(f"Network interface changed from {self.interface} to {interface}")
+                self.interface = interface
+                try:
+                    self.on_change(interface)
+                except Exception as e:
+                    logger.error(f"Error handling network interface change: {e}")
@@ -0,0 +1,263 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from Server_Health import HALF_OPEN, OPEN
+from Stats import JitterEstimator, confidence_half_width
+
+# Upper bound of simultaneous in-flight connects, keeps us well below OS socket/file descriptor limits
+DEFAULT_CONCURRENCY = 256
+# Fewest targets worth a process of their own, smaller shards spend more time starting the worker than probing
+MIN_SHARD_SIZE = 32
+
+
+# Open a single TCP connection and return the connect time in milliseconds (sub-ms precision), or None on failure.
+# `source` binds the socket to a local address so the connection leaves through that interface.
+async def tcp_connect_time(ip, port, timeout, source=None):
+    local_addr = (source, 0) if source is not None else None
+    start_time = time.perf_counter_ns()  # Monotonic, unaffected by wall clock adjustments
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port, local_addr=local_addr), timeout)
+    except (asyncio.TimeoutError, OSError):
+        return None
+
+    latency = (time.perf_counter_ns() - start_time) / 1_000_000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass  # Connection was already reset by the server, latency is still valid
+    return latency
+
+
+class SamplingPolicy:
+    """Adaptive attempt count of a probe run.
+
+    Attempts are started in batches of `parallel`, at most one batch every `pacing` seconds. The run stops once
+    the 95% confidence interval of the mean is within `target_ci` of it (or `min_ci_ms`, whichever is larger),
+    after `max_failed_batches` batches in a row without a single successful connect, or after `max_attempts`.
+    A lost packet now and then fails one attempt of a batch, not the batch, so it doesn't end a server's run.
+    """
+
+    __slots__ = ("min_attempts", "max_attempts", "target_ci", "min_ci_ms", "max_failed_batches", "pacing", "parallel")
+
+    def __init__(self, min_attempts=4, max_attempts=10, target_ci=0.05, min_ci_ms=0.5, max_failed_batches=2, pacing=0.05, parallel=2):
+        self.min_attempts = max(int(min_attempts), 2)
+        self.max_attempts = max(int(max_attempts), self.min_attempts)
+        self.target_ci = target_ci
+        self.min_ci_ms = min_ci_ms
+        self.max_failed_batches = max(int(max_failed_batches), 1)
+        self.pacing = pacing
+        self.parallel = max(int(parallel), 1)
+
+    @classmethod
+    def from_config(cls, settings):
+        """Build a policy from the "sampling" section of config.json."""
+        return cls(**(settings or {}))
+
+    def converged(self, summary):
+        latencies = summary.latencies
+        if len(latencies) < self.min_attempts:
+            return False
+        mean = sum(latencies) / len(latencies)
+        return confidence_half_width(len(latencies), summary.stddev) <= max(self.target_ci * mean, self.min_ci_ms)
+
+
+class ProbeSummary:
+    """Every individual connect of one server's probe run, None marks a failed attempt."""
+
+    __slots__ = ("ip", "port", "source", "timestamp", "samples", "stop_reason")
+
+    def __init__(self, ip, port, source=None):
+        self.ip = ip
+        self.port = port
+        self.source = source
+        self.timestamp = time.time()
+        self.samples = []
+        self.stop_reason = "attempts"  # "attempts", "converged", "timeouts" or "circuit_open"
+
+    @property
+    def latencies(self):
+        return [sample for sample in self.samples if sample is not None]
+
+    @property
+    def average(self):
+        latencies = self.latencies
+        return sum(latencies) / len(latencies) if latencies else None
+
+    @property
+    def stddev(self):
+        latencies = self.latencies
+        if len(latencies) < 2:
+            return None
+        mean = sum(latencies) / len(latencies)
+        return math.sqrt(sum((latency - mean) ** 2 for latency in latencies) / (len(latencies) - 1))
+
+    @property
+    def jitter(self):
+        latencies = self.latencies
+        if len(latencies) < 2:
+            return None
+        estimator = JitterEstimator()
+        for latency in latencies:
+            estimator.add(latency)
+        return estimator.jitter
+
+    @property
+    def loss(self):
+        """Percentage of failed attempts."""
+        if not self.samples:
+            return None
+        return 100 * (len(self.samples) - len(self.latencies)) / len(self.samples)
+
+
+# Probe a server with one or more sequential connects and keep every individual sample
+async def probe_summary(ip, port, timeout=1, attempts=1, semaphore=None, source=None):
+    summary = ProbeSummary(ip, port, source)
+
+    try:
+        for _ in range(attempts):
+            if semaphore is not None:
+                async with semaphore:
+                    latency = await tcp_connect_time(ip, port, timeout, source)
+            else:
+                latency = await tcp_connect_time(ip, port, timeout, source)
+            summary.samples.append(latency)
+    except Exception as e:
+        logger.error(f"Error occurred while probing {ip}:{port} - {e}")
+
+    return summary
+
+
+# Probe a server with paced batches of connects until the SamplingPolicy is satisfied.
+# With a ServerHealth the connect timeout follows its RTO and an open circuit breaker skips the server.
+async def adaptive_probe_summary(ip, port, policy, timeout=1, semaphore=None, health=None, source=None):
+    summary = ProbeSummary(ip, port, source)
+    loop = asyncio.get_running_loop()
+    if health is not None and not health.allow(time.time()):
+        summary.stop_reason = "circuit_open"
+        return summary
+
+    async def attempt():
+        attempt_timeout = health.timeout() if health is not None else timeout
+        if semaphore is not None:
+            async with semaphore:
+                return await tcp_connect_time(ip, port, attempt_timeout, source)
+        return await tcp_connect_time(ip, port, attempt_timeout, source)
+
+    failed_batches = 0  # Batches in a row in which every attempt failed
+    try:
+        while len(summary.samples) < policy.max_attempts:
+            started = loop.time()
+            batch = min(policy.parallel, policy.max_attempts - len(summary.samples))
+            if health is not None and health.state == HALF_OPEN:
+                batch = 1  # A single retry decides whether the server is back
+            latencies = await asyncio.gather(*(attempt() for _ in range(batch)))
+            failed_batches = failed_batches + 1 if all(latency is None for latency in latencies) else 0
+            for latency in latencies:
+                summary.samples.append(latency)
+                if health is not None:
+                    if latency is None:
+                        health.record_failure(time.time())
+                    else:
+                        health.record_success(latency, time.time())
+
+            if failed_batches >= policy.max_failed_batches or (health is not None and health.state == OPEN):
+                summary.stop_reason = "timeouts"
+                break
+            if policy.converged(summary):
+                summary.stop_reason = "converged"
+                break
+            await asyncio.sleep(max(policy.pacing - (loop.time() - started), 0))
+    except Exception as e:
+        logger.error(f"Error occurred while probing {ip}:{port} - {e}")
+
+    return summary
+
+
+# Probe a server with one or more sequential connects and return (ip, average latency in ms | None)
+async def probe(ip, port, timeout=1, attempts=1, semaphore=None, policy=None, health=None):
+    if policy is not None:
+        summary = await adaptive_probe_summary(ip, port, policy, timeout, semaphore, health)
+    else:
+        summary = await probe_summary(ip, port, timeout, attempts, semaphore)
+    return ip, summary.average
+
+
+# Probe every (ip, port) target concurrently on the running event loop
+# health: optional {ip: ServerHealth}, only used together with a SamplingPolicy
+async def probe_all(targets, timeout=1, attempts=1, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    health = health or {}
+    return await asyncio.gather(*(probe(ip, port, timeout, attempts, semaphore, policy, health.get(ip)) for ip, port in targets))
+
+
+async def _probe_targets(targets, timeout, attempts, semaphore, policy, health, source=None):
+    health = health or {}
+    if policy is not None:
+        return await asyncio.gather(*(adaptive_probe_summary(ip, port, policy, timeout, semaphore, health.get(ip), source) for ip, port in targets))
+    return await asyncio.gather(*(probe_summary(ip, port, timeout, attempts, semaphore, source) for ip, port in targets))
+
+
+# Same as probe_all but returns a ProbeSummary per target with the individual samples
+async def probe_all_summaries(targets, timeout=1, attempts=1, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    return await _probe_targets(targets, timeout, attempts, asyncio.Semaphore(concurrency), policy, health)
+
+
+# Probe every target through each local source address in the same sweep, returns {source: [ProbeSummary]}.
+# health: optional {source: {ip: ServerHealth}}, every path keeps its own breaker and RTT estimate.
+async def probe_all_paths(targets, sources, timeout=1, attempts=1, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    health = health or {}
+    results = await asyncio.gather(*(_probe_targets(targets, timeout, attempts, semaphore, policy, health.get(source), source) for source in sources))
+    return dict(zip(sources, results))
+
+
+# Blocking entry point for callers that don't run their own event loop
+def run_probes(targets, timeout=1, attempts=1, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    return asyncio.run(probe_all(targets, timeout, attempts, concurrency, policy, health))
+
+
+# Blocking entry point returning ProbeSummary objects
+def run_probe_summaries(targets, timeout=1, attempts=1, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    return asyncio.run(probe_all_summaries(targets, timeout, attempts, concurrency, policy, health))
+
+
+# Blocking entry point of probe_all_paths
+def run_probe_paths(targets, sources, timeout=1, attempts=1, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    return asyncio.run(probe_all_paths(targets, sources, timeout, attempts, concurrency, policy, health))
+
+
+# Worker of run_sharded_probe_summaries, returns the summaries and the health objects it updated (they are copies)
+def _probe_shard(targets, timeout, attempts, concurrency, policy, health):
+    return run_probe_summaries(targets, timeout, attempts, concurrency, policy, health), health
+
+
+# Worker processes run_sharded_probe_summaries uses for `targets`: at most `processes`, and no shard smaller than
+# MIN_SHARD_SIZE since a process costs more to start than a few dozen probes take. 1 means it probes in-process.
+def shard_count(targets, processes):
+    return max(min(processes, math.ceil(len(targets) / MIN_SHARD_SIZE)), 1)
+
+
+# run_probe_summaries split across `processes` worker processes, each probing its share on its own event loop.
+# Targets are dealt out round-robin so every shard gets a similar mix, `concurrency` is divided between the shards.
+# Returns the summaries in target order and writes the updated ServerHealth objects back into `health`.
+def run_sharded_probe_summaries(targets, processes, timeout=1, attempts=1, concurrency=DEFAULT_CONCURRENCY, policy=None, health=None):
+    processes = shard_count(targets, processes)
+    if processes == 1:
+        return run_probe_summaries(targets, timeout, attempts, concurrency, policy, health)
+
+    health = health if health is not None else {}
+    shards = [targets[index::processes] for index in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_probe_shard, shard, timeout, attempts, max(concurrency // processes, 1), policy,
+                                   {ip: health[ip] for ip, _ in shard if ip in health})
+                   for shard in shards]
+        results = [future.result() for future in futures]
+
+    summaries = [None] * len(targets)
+    for index, (shard_summaries, shard_health) in enumerate(results):
+        summaries[index::processes] = shard_summaries
+        health.update(shard_health)
+    return summaries
@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+import time
+from loguru import logger
+from Stats import StreamingStats
+
+HOUR = 3600
+DAY = 86400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    ts REAL NOT NULL,
+    interface TEXT NOT NULL,
+    server TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS samples_by_time ON samples (ts);
+CREATE INDEX IF NOT EXISTS samples_by_server ON samples (interface, server, ts);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    interface TEXT NOT NULL,
+    server TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    stats TEXT NOT NULL,
+    PRIMARY KEY (period, interface, server, bucket_start)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS server_stats (
+    interface TEXT NOT NULL,
+    server TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (interface, server)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SampleStore:
+    """Append-only SQLite (WAL) store of raw probe samples with hourly and daily rollups."""
+
+    def __init__(self, path, raw_retention_days=30):
+        self.path = path
+        self.raw_retention = raw_retention_days * DAY
+        self.compaction_thread = None
+        self.conn = self.connect()
+        self.conn.executescript(_SCHEMA)
+
+    def connect(self):
+        # Every thread gets its own connection, WAL lets the compactor run next to the writer
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def close(self):
+        self.wait_for_compaction()
+        self.conn.close()
+
+    # Append raw samples, rows are (ts, interface, server, port, latency_ms | None)
+    def append_samples(self, rows):
+        with self.conn:
+            self.conn.executemany("INSERT INTO samples (ts, interface, server, port, latency_ms) VALUES (?, ?, ?, ?, ?)", rows)
+
+    # Load the per-server running statistics of an interface in the log_data layout used by Ping_App
+    def load_log_data(self, interface):
+        rows = self.conn.execute("SELECT server, entry FROM server_stats WHERE interface = ?", (interface,))
+        return {server: json.loads(entry) for server, entry in rows}
+
+    # Persist only the log_data entries that changed during this run
+    def save_log_entries(self, interface, entries):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO server_stats (interface, server, entry) VALUES (?, ?, ?)",
+                [(interface, server, json.dumps(entry)) for server, entry in entries.items()]
+            )
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value, conn=None):
+        conn = conn or self.conn
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # Compact in a background thread so the probe run can finish its output meanwhile
+    def start_compaction(self):
+        if self.compaction_thread is not None and self.compaction_thread.is_alive():
+            return
+        self.compaction_thread = threading.Thread(target=self.compact, name="SampleStoreCompaction", daemon=True)
+        self.compaction_thread.start()
+
+    def wait_for_compaction(self):
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+
+    def compact(self, now=None):
+        """Roll completed hours of raw samples into hourly rows, completed days into daily rows, then expire old raw samples."""
+        now = now if now is not None else time.time()
+        conn = self.connect()
+        try:
+            self._rollup_hours(conn, int(now // HOUR) * HOUR)
+            self._rollup_days(conn, int(now // DAY) * DAY)
+            with conn:
+                conn.execute("DELETE FROM samples WHERE ts < ?", (now - self.raw_retention,))
+        except sqlite3.Error as e:
+            logger.error(f"Error compacting sample store {self.path}: {e}")
+        finally:
+            conn.close()
+
+    def _rollup_hours(self, conn, current_hour):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'hourly_compacted_until'").fetchone()
+        start = int(row[0]) if row else None
+        if start is None:
+            first = conn.execute("SELECT MIN(ts) FROM samples").fetchone()[0]
+            if first is None:
+                return
+            start = int(first // HOUR) * HOUR
+        if start >= current_hour:
+            return
+
+        rollups = {}
+        rows = conn.execute(
+            "SELECT ts, interface, server, latency_ms FROM samples WHERE ts >= ? AND ts < ?", (start, current_hour)
+        )
+        for ts, interface, server, latency in rows:
+            key = (int(ts // HOUR) * HOUR, interface, server)
+            if key not in rollups:
+                rollups[key] = [0, StreamingStats()]
+            if latency is None:
+                rollups[key][0] += 1
+            else:
+                rollups[key][1].add(latency)
+
+        self._write_rollups(conn, "hour", rollups)
+        self.set_meta("hourly_compacted_until", current_hour, conn)
+
+    def _rollup_days(self, conn, current_day):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'daily_compacted_until'").fetchone()
+        start = int(row[0]) if row else None
+        if start is None:
+            first = conn.execute("SELECT MIN(bucket_start) FROM rollups WHERE period = 'hour'").fetchone()[0]
+            if first is None:
+                return
+            start = int(first // DAY) * DAY
+        if start >= current_day:
+            return
+
+        # Days are built from the hourly rollups, so raw samples can expire independently
+        rollups = {}
+        rows = conn.execute(
+            "SELECT bucket_start, interface, server, failures, stats FROM rollups "
+            "WHERE period = 'hour' AND bucket_start >= ? AND bucket_start < ?", (start, current_day)
+        )
+        for bucket_start, interface, server, failures, stats in rows:
+            key = (bucket_start // DAY * DAY, interface, server)
+            if key not in rollups:
+                rollups[key] = [0, StreamingStats()]
+            rollups[key][0] += failures
+            rollups[key][1].merge(StreamingStats.from_dict(json.loads(stats)))
+
+        self._write_rollups(conn, "day", rollups)
+        self.set_meta("daily_compacted_until", current_day, conn)
+
+    def _write_rollups(self, conn, period, rollups):
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO rollups (period, bucket_start, interface, server, failures, stats) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (period, bucket_start, interface, server, failures, json.dumps(stats.to_dict()))
+                    for (bucket_start, interface, server), (failures, stats) in rollups.items()
+                ]
+            )
@@ -0,0 +1,207 @@
+import json
+import os
+import re
+import threading
+from loguru import logger
+
+LOGIN = "login"
+CHANNEL = "channel"
+AUCTION_HOUSE = "auction_house"
+CASH_SHOP = "cash_shop"
+OTHER = "other"
+
+PORTS = {LOGIN: 8484, CHANNEL: 8585, AUCTION_HOUSE: 8786, CASH_SHOP: 8786, OTHER: 8585}
+
+# "Login 1", "CH 01", "AH", "CS", optionally prefixed by a world name, e.g. "Kronos CH 12"
+_NAME_PATTERN = re.compile(r"^(?:(?P<world>.*?)\s+)?(?:(?P<login>Login)|(?P<channel>CH)|(?P<ah>AH)|(?P<cs>CS))(?:\s*(?P<number>\d+))?$", re.IGNORECASE)
+
+
+class CatalogError(ValueError):
+    pass
+
+
+class ServerRecord:
+    """One game server. kind is LOGIN, CHANNEL, AUCTION_HOUSE, CASH_SHOP or OTHER, channel is its number or None."""
+
+    __slots__ = ("ip", "name", "port", "kind", "channel", "world", "region")
+
+    def __init__(self, ip, name, port, kind, channel=None, world=None, region=None):
+        self.ip = ip
+        self.name = name
+        self.port = port
+        self.kind = kind
+        self.channel = channel
+        self.world = world
+        self.region = region
+
+    def __eq__(self, other):
+        return isinstance(other, ServerRecord) and all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return f"ServerRecord({self.ip!r}, {self.name!r}, {self.port}, {self.kind!r}, channel={self.channel}, world={self.world!r})"
+
+
+# Kind, channel number and world of a server from its display name
+def classify(name):
+    match = _NAME_PATTERN.match(name.strip())
+    if not match:
+        return classify_fallback(name), None, None
+    if match["login"]:
+        kind = LOGIN
+    elif match["channel"]:
+        kind = CHANNEL
+    elif match["ah"]:
+        kind = AUCTION_HOUSE
+    else:
+        kind = CASH_SHOP
+    number = int(match["number"]) if match["number"] else None
+    return kind, number, match["world"] or None
+
+
+# Substring rules of the tools before the catalog, for names like "Login Server 1", "Login-1" or "Cash Shop"
+def classify_fallback(name):
+    if "login" in name.lower():
+        return LOGIN
+    if "AH" in name or "auction house" in name.lower():
+        return AUCTION_HOUSE
+    if "CS" in name or "cash shop" in name.lower():
+        return CASH_SHOP
+    return OTHER
+
+
+# Build a record from a game_servers.json entry, either "CH 01" or {"name": "CH 01", "port": ..., "world": ..., "region": ...}
+def make_record(ip, entry):
+    if isinstance(entry, str):
+        entry = {"name": entry}
+    if not isinstance(entry, dict) or "name" not in entry:
+        raise CatalogError(f"Server {ip}: expected a name or an object with a \"name\", got {entry!r}")
+
+    kind, channel, world = classify(entry["name"])
+    kind = entry.get("kind", kind)
+    return ServerRecord(
+        ip,
+        entry["name"],
+        int(entry.get("port", PORTS.get(kind, PORTS[OTHER]))),
+        kind,
+        entry.get("channel", channel),
+        entry.get("world", world),
+        entry.get("region"),
+    )
+
+
+def _reject_duplicate_keys(pairs):
+    keys = [key for key, _ in pairs]
+    duplicates = sorted({key for key in keys if keys.count(key) > 1})
+    if duplicates:
+        raise CatalogError(f"Duplicate server ip {', '.join(duplicates)}, every ip may only be listed once")
+    return dict(pairs)
+
+
+class ServerCatalog:
+    """game_servers.json loaded once into ServerRecords, indexed by kind. Maps ip -> ServerRecord."""
+
+    def __init__(self, records=(), path=None):
+        self.path = path
+        self.signature = None  # (mtime_ns, size) of the file the records were read from
+        self.records = {}
+        self.by_kind = {}
+        for record in records:
+            self.records[record.ip] = record
+            self.by_kind.setdefault(record.kind, []).append(record)
+
+    @classmethod
+    def from_names(cls, servers, path=None):
+        """Catalog of a parsed game_servers.json object, {ip: name or entry object}."""
+        return cls((make_record(ip, entry) for ip, entry in servers.items()), path)
+
+    @classmethod
+    def load(cls, path):
+        """Raises OSError, json.JSONDecodeError or CatalogError (duplicate ips, invalid entries)."""
+        signature = cls._signature(path)
+        with open(path) as f:
+            catalog = cls.from_names(json.load(f, object_pairs_hook=_reject_duplicate_keys), path)
+        catalog.signature = signature
+
+        # Two ips named the same make their rows, logs and statistics indistinguishable
+        names = {}
+        for record in catalog:
+            if record.name in names:
+                raise CatalogError(f"Servers {names[record.name]} and {record.ip} are both named '{record.name}'")
+            names[record.name] = record.ip
+        return catalog
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        """Whether the file was modified since it was loaded, a single stat() call."""
+        try:
+            return self.path is not None and self._signature(self.path) != self.signature
+        except OSError:
+            return False
+
+    def __getitem__(self, ip):
+        return self.records[ip]
+
+    def __contains__(self, ip):
+        return ip in self.records
+
+    def __iter__(self):
+        return iter(self.records.values())
+
+    def __len__(self):
+        return len(self.records)
+
+    def names(self):
+        return {ip: record.name for ip, record in self.records.items()}
+
+    def ports(self):
+        return {ip: record.port for ip, record in self.records.items()}
+
+
+# Accept either a ServerCatalog or a plain {ip: name} dict
+def as_catalog(servers):
+    return servers if isinstance(servers, ServerCatalog) else ServerCatalog.from_names(servers)
+
+
+class CatalogWatcher:
+    """Background thread reloading the catalog file when it changes, calls on_change(catalog) with the new catalog.
+
+    An invalid file is logged and ignored, the previous catalog stays in use.
+    """
+
+    def __init__(self, catalog, on_change, interval=2.0):
+        self.catalog = catalog
+        self.on_change = on_change
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.catalog.path is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="CatalogWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            if not self.catalog.changed():
+                continue
+            try:
+                catalog = ServerCatalog.load(self.catalog.path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Keeping the previous server list, could not reload {self.catalog.path}: {e}")
+                self.catalog.signature = ServerCatalog._signature(self.catalog.path) if os.path.exists(self.catalog.path) else None
+                continue
+            logger.info(f"Reloaded {len(catalog)} servers from {catalog.path}")
+            self.catalog = catalog
+            try:
+                self.on_change(catalog)
+            except Exception as e:
+                logger.error(f"Error handling server list change: {e}")
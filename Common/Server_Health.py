@@ -0,0 +1,103 @@
+CLOSED = "closed"  # Probing normally
+OPEN = "open"  # Too many failures in a row, probes are skipped until the backoff expires
+HALF_OPEN = "half_open"  # Backoff expired, a single retry decides between closed and open
+
+
+class ServerHealth:
+    """Circuit breaker and TCP RTO style connect timeout (RFC 6298 SRTT/RTTVAR) of one server.
+
+    Times are in seconds, `now` is wall clock time so the state can be saved and restored between runs.
+    """
+
+    __slots__ = ("srtt", "rttvar", "failures", "state", "open_until", "backoff",
+                 "failure_threshold", "base_backoff", "max_backoff", "min_timeout", "max_timeout")
+
+    def __init__(self, failure_threshold=3, base_backoff=5.0, max_backoff=120.0, min_timeout=0.25, max_timeout=2.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.reset()
+
+    def reset(self):
+        self.srtt = None
+        self.rttvar = None
+        self.failures = 0  # Consecutive failures
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.backoff = self.base_backoff
+
+    def seed(self, mean, stddev):
+        """Start the estimator from a known latency (ms), e.g. the statistics of previous runs."""
+        if self.srtt is None:
+            self.srtt = mean / 1000
+            self.rttvar = max(stddev / 1000, self.srtt / 4)
+
+    def timeout(self):
+        if self.srtt is None:
+            return self.max_timeout
+        rto = self.srtt + 4 * self.rttvar
+        # Double per consecutive failure like a TCP retransmission timer, a slow answer isn't mistaken for a dead server
+        rto *= 2 ** min(self.failures, 6)
+        return min(max(rto, self.min_timeout), self.max_timeout)
+
+    def allow(self, now):
+        """Whether a probe may be sent now, moves an expired open breaker to half-open."""
+        if self.state == OPEN:
+            if now < self.open_until:
+                return False
+            self.state = HALF_OPEN
+        return True
+
+    def record_success(self, latency, now):
+        """Feed a connect time in ms. Returns the number of failures of the outage it ended, 0 if there was none."""
+        sample = latency / 1000
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+
+        outage = self.failures if self.state != CLOSED else 0
+        self.failures = 0
+        self.state = CLOSED
+        self.backoff = self.base_backoff
+        return outage
+
+    def record_failure(self, now):
+        """Returns True when this failure opened the breaker, False for failures below the threshold and failed retries."""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # The retry failed, wait twice as long before the next one
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.state = OPEN
+            self.open_until = now + self.backoff
+            return False
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.open_until = now + self.backoff
+            return True
+        return False
+
+    def to_dict(self):
+        return {
+            "srtt": self.srtt,
+            "rttvar": self.rttvar,
+            "failures": self.failures,
+            "state": self.state,
+            "open_until": self.open_until,
+            "backoff": self.backoff,
+        }
+
+    @classmethod
+    def from_dict(cls, data, **settings):
+        health = cls(**settings)
+        health.srtt = data.get("srtt")
+        health.rttvar = data.get("rttvar")
+        health.failures = data.get("failures", 0)
+        health.state = data.get("state", CLOSED)
+        health.open_until = data.get("open_until", 0.0)
+        health.backoff = data.get("backoff", health.base_backoff)
+        return health
@@ -0,0 +1,153 @@
+import math
+
+# Latency histogram layout: log-spaced buckets growing 4% per bucket between 1 ms and ~12 s.
+# Bucket 0 collects everything below 1 ms, so percentiles carry at most ~2% relative error.
+HISTOGRAM_GROWTH = 1.04
+HISTOGRAM_BUCKETS = 240
+_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+
+def bucket_index(value):
+    if value < 1:
+        return 0
+    return min(int(math.log(value) / _LOG_GROWTH) + 1, HISTOGRAM_BUCKETS - 1)
+
+
+# Representative value of a bucket, the geometric midpoint of its bounds
+def bucket_value(index):
+    if index == 0:
+        return 0.5
+    return HISTOGRAM_GROWTH ** (index - 0.5)
+
+
+# Two-sided 95% Student t critical values by degrees of freedom, 1.96 (normal) beyond the table
+_T_CRITICAL_95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                  2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086)
+
+
+# Half-width of the 95% confidence interval of a mean estimated from `count` samples
+def confidence_half_width(count, stddev):
+    if count < 2:
+        return float('inf')
+    dof = count - 1
+    t = _T_CRITICAL_95[dof - 1] if dof <= len(_T_CRITICAL_95) else 1.96
+    return t * stddev / math.sqrt(count)
+
+
+class StreamingStats:
+    """Running latency aggregate: count, sum, min, max, Welford variance and a fixed-size histogram, O(1) per sample."""
+
+    __slots__ = ("count", "total", "min", "max", "mean", "m2", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    @classmethod
+    def from_samples(cls, samples):
+        stats = cls()
+        for sample in samples:
+            stats.add(sample)
+        return stats
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        # Welford's online update of mean and sum of squared deviations
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        self.histogram[bucket_index(value)] += 1
+
+    def merge(self, other):
+        """Fold another aggregate into this one (Chan et al. parallel variance)."""
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for index, bucket_count in enumerate(other.histogram):
+            self.histogram[index] += bucket_count
+        return self
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def stddev(self):
+        return math.sqrt(self.variance())
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100) from the histogram, None when no samples were recorded."""
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.histogram):
+            seen += bucket_count
+            if seen >= rank:
+                # Clamp to the exact extremes so p0/p100 and single-sample stats are exact
+                return min(max(bucket_value(index), self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "mean": self.mean,
+            "m2": self.m2,
+            # Stored sparsely, most buckets of a single server are empty
+            "histogram": {str(index): bucket_count for index, bucket_count in enumerate(self.histogram) if bucket_count},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data.get("count", 0)
+        stats.total = data.get("sum", 0.0)
+        stats.min = data["min"] if data.get("min") is not None else float('inf')
+        stats.max = data["max"] if data.get("max") is not None else float('-inf')
+        stats.mean = data.get("mean", 0.0)
+        stats.m2 = data.get("m2", 0.0)
+        for index, bucket_count in data.get("histogram", {}).items():
+            stats.histogram[int(index)] = bucket_count
+        return stats
+
+
+class JitterEstimator:
+    """RFC 3550 interarrival jitter: J += (|D| - J) / 16, D being the change between consecutive latencies.
+
+    The estimate is seeded with the first |D| instead of 0, so short runs of a few probes aren't biased low.
+    """
+
+    __slots__ = ("jitter", "previous")
+
+    def __init__(self):
+        self.jitter = None
+        self.previous = None
+
+    def add(self, value):
+        if self.previous is not None:
+            difference = abs(value - self.previous)
+            self.jitter = difference if self.jitter is None else self.jitter + (difference - self.jitter) / 16
+        self.previous = value
+        return self.jitter
+
+    def reset(self):
+        self.jitter = None
+        self.previous = None